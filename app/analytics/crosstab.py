@@ -0,0 +1,210 @@
+"""Cross-tabulations of answers to two questions.
+
+Answers are read in chunks and turned into NumPy arrays: choice answers
+become category codes (one entry per selected option, so multiple choice
+answers can count towards several categories) and ``number`` answers
+become floats. Each respondent, a user's attempt, gets a dense index, so
+joining two questions is plain array indexing.
+
+The row question groups respondents and must be a choice question. A
+choice column question gives a contingency table; a ``number`` column
+question gives grouped counts, means and percentiles.
+"""
+
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+import time
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.cache import VersionedCache
+from app.config import settings
+from app.questions.models import Question, UserAnswer
+from app.sharding import each_shard
+
+CHOICE_TYPES = ("single_choice", "multiple_choice")
+NUMBER_TYPES = ("number",)
+
+CHUNK_SIZE = 50_000
+
+# Results are kept for ANALYTICS_CACHE_SECONDS rather than versioned by
+# answer writes, which would all have to update one shared row
+crosstab_cache = VersionedCache(
+    "crosstab",
+    maxsize=256,
+    load_version=lambda db: int(time.monotonic() // settings.ANALYTICS_CACHE_SECONDS),
+)
+
+
+class AnswerColumn(NamedTuple):
+    respondents: np.ndarray  # Respondent index of every entry
+    values: np.ndarray  # Category code or number of every entry
+    categories: Optional[List[str]]  # None for number questions
+
+
+def _decode(question: Question, answer_value: Any, codes: Dict[str, int]) -> List:
+    if question.type == "number":
+        try:
+            return [float(answer_value)]
+        except (TypeError, ValueError):
+            return []
+    selected = answer_value if isinstance(answer_value, list) else [answer_value]
+    return [codes[value] for value in selected if value in codes]
+
+
+def load_answers(
+    db: Session,
+    question: Question,
+    respondents: Dict[Tuple[str, int], int],
+    chunk_size: int = CHUNK_SIZE,
+) -> AnswerColumn:
+    """Load every stored answer to ``question`` into arrays.
+
+    ``respondents`` maps (user_id, attempt) to a dense index and is extended
+    with respondents seen for the first time, so columns loaded with the
+    same mapping line up.
+    """
+    categories = list(question.options or []) if question.type in CHOICE_TYPES else None
+    codes = {option: code for code, option in enumerate(categories or [])}
+    dtype = np.float64 if categories is None else np.int32
+
+    result = db.execute(
+        select(UserAnswer.user_id, UserAnswer.attempt, UserAnswer.answer_value)
+        .where(UserAnswer.question_id == question.id)
+        .execution_options(yield_per=chunk_size)
+    )
+    respondent_chunks, value_chunks = [], []
+    for chunk in result.partitions():
+        chunk_respondents, chunk_values = [], []
+        for user_id, attempt, answer_value in chunk:
+            values = _decode(question, answer_value, codes)
+            index = respondents.setdefault((user_id, attempt), len(respondents))
+            chunk_respondents.extend([index] * len(values))
+            chunk_values.extend(values)
+        respondent_chunks.append(np.array(chunk_respondents, dtype=np.int64))
+        value_chunks.append(np.array(chunk_values, dtype=dtype))
+
+    return AnswerColumn(
+        np.concatenate(respondent_chunks or [np.empty(0, np.int64)]),
+        np.concatenate(value_chunks or [np.empty(0, dtype)]),
+        categories,
+    )
+
+
+def _load_all_shards(
+    db: Session, question: Question, respondents: Dict[Tuple[str, int], int]
+) -> AnswerColumn:
+    columns = [load_answers(s, question, respondents) for s in each_shard(db)]
+    return AnswerColumn(
+        np.concatenate([column.respondents for column in columns]),
+        np.concatenate([column.values for column in columns]),
+        columns[0].categories,
+    )
+
+
+def _indicators(column: AnswerColumn, size: int) -> np.ndarray:
+    # Respondents x categories, True where the respondent chose the category
+    indicators = np.zeros((size, len(column.categories)), dtype=bool)
+    indicators[column.respondents, column.values] = True
+    return indicators
+
+
+def _numbers(column: AnswerColumn, size: int) -> np.ndarray:
+    numbers = np.full(size, np.nan)
+    numbers[column.respondents] = column.values
+    return numbers
+
+
+def _as_list(values: np.ndarray) -> List[Optional[float]]:
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def contingency_table(rows: np.ndarray, columns: np.ndarray) -> np.ndarray:
+    return rows.T.astype(np.int64) @ columns.astype(np.int64)
+
+
+def grouped_statistics(
+    rows: np.ndarray, numbers: np.ndarray, percentiles: Sequence[float]
+) -> Dict[str, Any]:
+    answered = ~np.isnan(numbers)
+    counts = rows.T.astype(np.int64) @ answered
+    sums = rows.T.astype(np.float64) @ np.where(answered, numbers, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+
+    # One vectorized percentile computation per category
+    by_category = np.full((rows.shape[1], len(percentiles)), np.nan)
+    for category in range(rows.shape[1]):
+        values = numbers[rows[:, category] & answered]
+        if values.size:
+            by_category[category] = np.percentile(values, percentiles)
+
+    return {
+        "group_counts": counts.tolist(),
+        "means": _as_list(means),
+        "percentiles": {
+            f"{percentile:g}": _as_list(by_category[:, position])
+            for position, percentile in enumerate(percentiles)
+        },
+    }
+
+
+def suppress_small_cells(result: Dict[str, Any], min_cell_size: int) -> None:
+    # Withhold anything computed from fewer than min_cell_size respondents
+    def small(count: Optional[int]) -> bool:
+        return count is not None and count < min_cell_size
+
+    if "counts" in result:
+        result["counts"] = [
+            [None if small(count) else count for count in row]
+            for row in result["counts"]
+        ]
+        return
+    for category, count in enumerate(result["group_counts"]):
+        if small(count):
+            result["group_counts"][category] = None
+            result["means"][category] = None
+            for values in result["percentiles"].values():
+                values[category] = None
+
+
+def crosstab(
+    db: Session,
+    row_question: Question,
+    column_question: Question,
+    percentiles: Sequence[float],
+) -> Dict[str, Any]:
+    key: Hashable = (row_question.id, column_question.id, tuple(percentiles))
+    # ANALYTICS_CACHE_SECONDS <= 0 computes every cross-tab afresh
+    cache = settings.ANALYTICS_CACHE_SECONDS > 0
+    cached = crosstab_cache.get(db, key) if cache else None
+    if cached is not None:
+        return cached
+
+    respondents: Dict[Tuple[str, int], int] = {}
+    row_column = _load_all_shards(db, row_question, respondents)
+    other_column = _load_all_shards(db, column_question, respondents)
+
+    rows = _indicators(row_column, len(respondents))
+    result: Dict[str, Any] = {
+        "row_question_id": row_question.id,
+        "column_question_id": column_question.id,
+        "row_categories": row_column.categories,
+    }
+
+    if other_column.categories is None:
+        numbers = _numbers(other_column, len(respondents))
+        both = rows.any(axis=1) & ~np.isnan(numbers)
+        result.update(grouped_statistics(rows, numbers, percentiles))
+    else:
+        columns = _indicators(other_column, len(respondents))
+        both = rows.any(axis=1) & columns.any(axis=1)
+        result["column_categories"] = other_column.categories
+        result["counts"] = contingency_table(rows, columns).tolist()
+    result["respondents"] = int(both.sum())
+    suppress_small_cells(result, settings.ANALYTICS_MIN_CELL_SIZE)
+
+    if cache:
+        crosstab_cache.set(key, result)
+    return result
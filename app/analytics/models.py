@@ -0,0 +1,20 @@
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel
+
+
+# Pydantic models for API
+class CrosstabResponse(BaseModel):
+    row_question_id: str
+    column_question_id: str
+    row_categories: List[str]
+    respondents: int  # Respondents who answered both questions
+    # Choice column question: counts[row category][column category]; counts
+    # below ANALYTICS_MIN_CELL_SIZE are null
+    column_categories: Optional[List[str]] = None
+    counts: Optional[List[List[Optional[int]]]] = None
+    # Number column question: statistics per row category, all null for
+    # categories with fewer than ANALYTICS_MIN_CELL_SIZE respondents
+    group_counts: Optional[List[Optional[int]]] = None
+    means: Optional[List[Optional[float]]] = None
+    percentiles: Optional[Dict[str, List[Optional[float]]]] = None
@@ -0,0 +1,59 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session
+from typing import List
+
+from app.config import settings
+from app.database import get_db
+from app.profiling import ProfiledRoute
+from app.auth.router import get_current_user
+from app.auth.models import User
+from app.analytics.crosstab import CHOICE_TYPES, NUMBER_TYPES, crosstab
+from app.analytics.models import CrosstabResponse
+from app.questions.cache import load_question
+
+router = APIRouter(prefix="/api", tags=["analytics"], route_class=ProfiledRoute)
+
+
+# Analytics span every respondent's answers, so only analysts may see them
+def get_current_analyst(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.id not in settings.ANALYST_USER_IDS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN, detail="Analyst access required"
+        )
+    return current_user
+
+
+# Cross-tabulate the answers to two questions
+@router.get("/analytics/crosstab", response_model=CrosstabResponse)
+def get_crosstab(
+    row_question_id: str,
+    column_question_id: str,
+    percentiles: List[float] = Query([25, 50, 75]),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_analyst),
+):
+    row_question = load_question(db, row_question_id)
+    column_question = load_question(db, column_question_id)
+    if not row_question or not column_question:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Question not found"
+        )
+
+    # Rows group respondents by category; columns are categories or numbers
+    if row_question.type not in CHOICE_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Row question must be a choice question",
+        )
+    if column_question.type not in CHOICE_TYPES + NUMBER_TYPES:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Column question must be a choice or number question",
+        )
+    if not all(0 <= percentile <= 100 for percentile in percentiles):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Percentiles must be between 0 and 100",
+        )
+
+    return crosstab(db, row_question, column_question, percentiles)
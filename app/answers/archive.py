@@ -0,0 +1,347 @@
+"""Columnar archive for answers of long-finished questionnaires.
+
+Completed attempts whose last activity is older than ARCHIVE_AFTER_DAYS are
+moved out of ``user_answers`` into compressed segment files under
+ARCHIVE_DIR, so the live table only holds answers of active users.
+
+A segment stores one zlib-compressed array per column. Question ids, user
+ids and answer values are dictionary-encoded, and rows are sorted by user
+so each user's answers form one contiguous run. A bucketed index maps a
+user id to the attempt those answers belong to and its runs, which is all
+get_summary needs to serve an archived user's answers. Writes to an archived
+attempt first restore its answers to ``user_answers``, so a later archive of
+the same attempt stores all of them again.
+
+Run the job from the repository root:
+
+    python -m app.answers.archive --older-than-days 90
+"""
+
+from array import array
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+import zlib
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.questions.models import UserAnswer, UserProgress, UserSummary
+
+MAGIC = b"QSEG1"
+EPOCH = datetime(1970, 1, 1)
+NO_TIMESTAMP = -(2**63)
+
+# Column name -> array typecode; all columns have one entry per row
+COLUMNS = {
+    "user": "I",
+    "question": "I",
+    "answer": "I",
+    "is_correct": "b",
+    "timestamp": "q",
+    "sequence_number": "i",
+}
+
+
+def _encode_column(typecode: str, values: List[int]) -> bytes:
+    column = array(typecode, values)
+    if sys.byteorder == "big":
+        column.byteswap()
+    return zlib.compress(column.tobytes(), 9)
+
+
+def _decode_column(typecode: str, data: bytes) -> array:
+    column = array(typecode)
+    column.frombytes(zlib.decompress(data))
+    if sys.byteorder == "big":
+        column.byteswap()
+    return column
+
+
+class _Dictionary:
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+def write_segment(path: str, answers: List[UserAnswer]) -> Dict[str, Tuple[int, int]]:
+    """Write answers (sorted by user) to a segment and return each user's run."""
+    users, questions, values = _Dictionary(), _Dictionary(), _Dictionary()
+    columns: Dict[str, List[int]] = {name: [] for name in COLUMNS}
+    runs: Dict[str, Tuple[int, int]] = {}
+
+    previous_timestamp = 0
+    for row, answer in enumerate(answers):
+        start, count = runs.get(answer.user_id, (row, 0))
+        runs[answer.user_id] = (start, count + 1)
+        if count == 0:
+            # Deltas restart with each user so a run decodes on its own
+            previous_timestamp = 0
+
+        columns["user"].append(users.encode(answer.user_id))
+        columns["question"].append(questions.encode(answer.question_id))
+        columns["answer"].append(
+            values.encode(json.dumps(answer.answer_value, sort_keys=True))
+        )
+        columns["is_correct"].append(
+            -1 if answer.is_correct is None else int(answer.is_correct)
+        )
+        columns["sequence_number"].append(answer.sequence_number)
+
+        # Timestamps are stored as deltas, which compress far better
+        if answer.timestamp is None:
+            columns["timestamp"].append(NO_TIMESTAMP)
+        else:
+            micros = (answer.timestamp - EPOCH) // timedelta(microseconds=1)
+            columns["timestamp"].append(micros - previous_timestamp)
+            previous_timestamp = micros
+
+    blobs = {
+        name: _encode_column(typecode, columns[name])
+        for name, typecode in COLUMNS.items()
+    }
+
+    header = {
+        "rows": len(answers),
+        "users": users.values,
+        "questions": questions.values,
+        "values": values.values,
+        "columns": {name: len(blob) for name, blob in blobs.items()},
+    }
+    header_bytes = zlib.compress(json.dumps(header).encode(), 9)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as segment:
+        segment.write(MAGIC)
+        segment.write(struct.pack("<I", len(header_bytes)))
+        segment.write(header_bytes)
+        for name in COLUMNS:
+            segment.write(blobs[name])
+        segment.flush()
+        os.fsync(segment.fileno())
+    os.replace(tmp_path, path)
+
+    return runs
+
+
+@lru_cache(maxsize=8)
+def _read_segment(path: str, mtime: float) -> Tuple[dict, Dict[str, array]]:
+    with open(path, "rb") as segment:
+        if segment.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not an answer archive segment")
+        (header_length,) = struct.unpack("<I", segment.read(4))
+        header = json.loads(zlib.decompress(segment.read(header_length)))
+        columns = {
+            name: _decode_column(typecode, segment.read(header["columns"][name]))
+            for name, typecode in COLUMNS.items()
+        }
+    return header, columns
+
+
+def read_rows(path: str, start: int, count: int) -> List[Dict[str, Any]]:
+    header, columns = _read_segment(path, os.path.getmtime(path))
+    timestamps = columns["timestamp"]
+
+    micros = 0
+    rows = []
+    for row in range(start, start + count):
+        timestamp = None
+        if timestamps[row] != NO_TIMESTAMP:
+            micros += timestamps[row]
+            timestamp = EPOCH + timedelta(microseconds=micros)
+
+        is_correct = columns["is_correct"][row]
+        rows.append(
+            {
+                "user_id": header["users"][columns["user"][row]],
+                "question_id": header["questions"][columns["question"][row]],
+                "answer_value": json.loads(header["values"][columns["answer"][row]]),
+                "is_correct": None if is_correct == -1 else bool(is_correct),
+                "timestamp": timestamp,
+                "sequence_number": columns["sequence_number"][row],
+            }
+        )
+    return rows
+
+
+def _bucket_path(directory: str, user_id: str) -> str:
+    # 256 small index files instead of one that grows with every user
+    bucket = hashlib.sha1(user_id.encode()).hexdigest()[:2]
+    return os.path.join(directory, "index", f"{bucket}.json")
+
+
+def _load_bucket(path: str) -> Dict[str, dict]:
+    try:
+        with open(path) as bucket:
+            return json.load(bucket)
+    except FileNotFoundError:
+        return {}
+
+
+def _update_index(
+    directory: str,
+    segment: str,
+    runs: Dict[str, Tuple[int, int]],
+    attempts: Dict[str, int],
+):
+    buckets: Dict[str, Dict[str, dict]] = {}
+    for user_id, (start, count) in runs.items():
+        path = _bucket_path(directory, user_id)
+        if path not in buckets:
+            buckets[path] = _load_bucket(path)
+        entry = buckets[path].get(user_id)
+        if entry is None or entry["attempt"] != attempts[user_id]:
+            # Restarting deletes every answer, so an earlier attempt's runs
+            # are never needed again
+            entry = {"attempt": attempts[user_id], "runs": []}
+            buckets[path][user_id] = entry
+        # The same attempt may be archived again after the user changed it
+        entry["runs"].append([segment, start, count])
+
+    os.makedirs(os.path.join(directory, "index"), exist_ok=True)
+    for path, entries in buckets.items():
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as bucket:
+            json.dump(entries, bucket, separators=(",", ":"))
+        os.replace(tmp_path, path)
+
+
+def load_archived_answers(
+    user_id: str, attempt: int
+) -> Optional[List[Dict[str, Any]]]:
+    """Return the archived answers of a user's attempt ordered by sequence,
+    or None."""
+    directory = settings.ARCHIVE_DIR
+    entry = _load_bucket(_bucket_path(directory, user_id)).get(user_id)
+    if entry is None or entry["attempt"] != attempt:
+        return None
+
+    # Later runs hold the newer answer to a question
+    answers: Dict[str, Dict[str, Any]] = {}
+    for segment, start, count in entry["runs"]:
+        for row in read_rows(os.path.join(directory, segment), start, count):
+            answers[row["question_id"]] = row
+    return sorted(answers.values(), key=lambda row: row["sequence_number"])
+
+
+def restore_archived_answers(db: Session, user_id: str, attempt: int) -> int:
+    """Copy an archived attempt's answers back into ``user_answers``.
+
+    Called before changing a completed attempt, whose answers may have been
+    archived, so its live rows hold every answer again. Answers the user has
+    given since are kept. Returns the number of answers restored.
+    """
+    rows = load_archived_answers(user_id, attempt)
+    if not rows:
+        return 0
+
+    live = {
+        question_id
+        for (question_id,) in db.query(UserAnswer.question_id).filter(
+            UserAnswer.user_id == user_id, UserAnswer.attempt == attempt
+        )
+    }
+    restored = [
+        UserAnswer(attempt=attempt, **row)
+        for row in rows
+        if row["question_id"] not in live
+    ]
+    db.add_all(restored)
+    # Flushed now, as answer upserts bypass the session's pending rows
+    db.flush()
+    return len(restored)
+
+
+def archive_completed_answers(
+    db: Session, older_than: timedelta, batch_size: int = 1000
+) -> int:
+    """Move answers of completed, inactive attempts into segment files.
+
+    Returns the number of answers archived.
+    """
+    directory = settings.ARCHIVE_DIR
+    os.makedirs(directory, exist_ok=True)
+    cutoff = datetime.now() - older_than
+    archived = 0
+
+    while True:
+        user_ids = [
+            user_id
+            for (user_id,) in db.query(UserProgress.user_id)
+            .join(UserAnswer, UserAnswer.user_id == UserProgress.user_id)
+            .filter(
+                UserProgress.is_completed == True,  # noqa: E712
+                UserProgress.last_activity < cutoff,
+            )
+            .distinct()
+            .limit(batch_size)
+            .all()
+        ]
+        if not user_ids:
+            return archived
+
+        answers = (
+            db.query(UserAnswer)
+            .filter(UserAnswer.user_id.in_(user_ids))
+            .order_by(UserAnswer.user_id, UserAnswer.sequence_number)
+            .all()
+        )
+
+        segment = f"segment-{int(time.time() * 1000)}.qseg"
+        runs = write_segment(os.path.join(directory, segment), answers)
+        attempts = {answer.user_id: answer.attempt for answer in answers}
+        _update_index(directory, segment, runs, attempts)
+
+        # Delete exactly the rows written, never answers added since
+        answer_ids = [answer.id for answer in answers]
+        db.query(UserAnswer).filter(UserAnswer.id.in_(answer_ids)).delete(
+            synchronize_session=False
+        )
+        db.query(UserSummary).filter(UserSummary.user_id.in_(user_ids)).delete(
+            synchronize_session=False
+        )
+        db.commit()
+        db.expunge_all()
+
+        archived += len(answers)
+        print(f"Archived {len(answers)} answers of {len(runs)} users to {segment}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--older-than-days", type=int, default=settings.ARCHIVE_AFTER_DAYS
+    )
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    from app.database import SessionLocal
+
+    from app.sharding import each_shard
+
+    db = SessionLocal()
+    try:
+        # Each shard is archived in turn; unsharded this is just the database
+        total = sum(
+            archive_completed_answers(
+                shard_db, timedelta(days=args.older_than_days), args.batch_size
+            )
+            for shard_db in each_shard(db)
+        )
+    finally:
+        db.close()
+    print(f"Archived {total} answers in total")
@@ -0,0 +1,73 @@
+from typing import Any
+
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.questions.models import UserAnswer
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+CONFLICT_COLUMNS = ["user_id", "attempt", "question_id"]
+
+
+def upsert_answer(
+    db: Session,
+    user_id: str,
+    attempt: int,
+    question_id: str,
+    answer_value: Any,
+    is_correct: Any,
+    sequence_number: int,
+) -> None:
+    """Store the user's answer to a question, replacing any earlier one.
+
+    Runs as a single statement against the unique (user_id, attempt,
+    question_id) index, so concurrent submissions of the same answer can't
+    create duplicate rows.
+    """
+    values = dict(
+        answer_value=answer_value,
+        is_correct=is_correct,
+        sequence_number=sequence_number,
+    )
+    insert = UPSERT_DIALECTS.get(db.get_bind(UserAnswer).dialect.name)
+
+    if insert is None:
+        # Other databases fall back to a read followed by an update or insert
+        answer = (
+            db.query(UserAnswer)
+            .filter(
+                UserAnswer.user_id == user_id,
+                UserAnswer.attempt == attempt,
+                UserAnswer.question_id == question_id,
+            )
+            .first()
+        )
+        if answer is None:
+            answer = UserAnswer(
+                user_id=user_id, attempt=attempt, question_id=question_id
+            )
+            db.add(answer)
+        for name, value in values.items():
+            setattr(answer, name, value)
+        answer.timestamp = func.now()
+        return
+
+    statement = insert(UserAnswer).values(
+        user_id=user_id, attempt=attempt, question_id=question_id, **values
+    )
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=CONFLICT_COLUMNS,
+            set_=dict(values, timestamp=func.now()),
+        )
+    )
+
+
+def delete_answers(db: Session, user_id: str) -> None:
+    db.query(UserAnswer).filter(UserAnswer.user_id == user_id).delete()
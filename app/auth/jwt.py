@@ -1,6 +1,11 @@
+from collections import OrderedDict
 from datetime import datetime, timedelta
-from typing import Any, Optional, Union
-from jose import jwt
+from typing import Any, Dict, Optional, Union
+import hashlib
+import threading
+import time
+from jose import jwt, JWTError
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError
 from pydantic import BaseModel
 from app.config import settings
 
@@ -14,8 +19,15 @@ class TokenPayload(BaseModel):
     sub: Optional[str] = None
 
 
+def key_id(key: str) -> str:
+    # Short fingerprint so tokens name the key that signed them
+    return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+
 def create_access_token(
-    subject: Union[str, Any], expires_delta: Optional[timedelta] = None
+    subject: Union[str, Any],
+    expires_delta: Optional[timedelta] = None,
+    claims: Optional[Dict[str, Any]] = None,
 ) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -24,9 +36,94 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
 
-    to_encode = {"exp": expire, "sub": str(subject)}
+    # Extra claims, such as the user's name and email, spare authenticated
+    # requests a user lookup
+    to_encode = {**(claims or {}), "exp": expire, "sub": str(subject)}
     encoded_jwt = jwt.encode(
-        to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM
+        to_encode,
+        settings.SECRET_KEY,
+        algorithm=settings.ALGORITHM,
+        headers={"kid": key_id(settings.SECRET_KEY)},
     )
 
     return encoded_jwt
+
+
+class VerifiedTokenCache:
+    """Claims of tokens whose signature has already been verified.
+
+    Keyed by a digest of the token, so the cache holds no usable tokens.
+    Entries are only returned until the token's own expiry, so a cached
+    token is never accepted for longer than verifying it again would allow.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._claims: "OrderedDict[bytes, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        with self._lock:
+            claims = self._claims.get(key)
+            if claims is not None and claims["exp"] > time.time():
+                self._claims.move_to_end(key)
+                self.hits += 1
+                return claims
+            if claims is not None:
+                del self._claims[key]
+            self.misses += 1
+            return None
+
+    def set(self, token: str, claims: Dict[str, Any]) -> None:
+        if self.maxsize <= 0 or not isinstance(claims.get("exp"), (int, float)):
+            return
+        key = self._key(token)
+        with self._lock:
+            self._claims[key] = claims
+            self._claims.move_to_end(key)
+            while len(self._claims) > self.maxsize:
+                self._claims.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._claims.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._claims), "hits": self.hits, "misses": self.misses}
+
+
+verified_tokens = VerifiedTokenCache(settings.VERIFIED_TOKEN_CACHE_SIZE)
+
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    claims = verified_tokens.get(token)
+    if claims is None:
+        claims = verify_access_token(token)
+        verified_tokens.set(token, claims)
+    return claims
+
+
+def verify_access_token(token: str) -> Dict[str, Any]:
+    keys = settings.verification_keys
+
+    # Try the key named in the header first, then any other active key
+    kid = jwt.get_unverified_header(token).get("kid")
+    keys = sorted(keys, key=lambda key: key_id(key) != kid)
+
+    for key in keys:
+        try:
+            return jwt.decode(token, key, algorithms=[settings.ALGORITHM])
+        except (ExpiredSignatureError, JWTClaimsError):
+            # The signature matched, so no other key will do better
+            raise
+        except JWTError:
+            continue
+
+    raise JWTError("Signature verification failed")
@@ -1,17 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from jose import JWTError, jwt
+from jose import JWTError
 from datetime import timedelta
-from typing import Optional
+from typing import Any, Dict, Optional
 from pydantic import BaseModel, EmailStr
 
 from app.database import get_db
+from app.profiling import ProfiledRoute
+from app.replica import get_read_db
+from app.sharding import route_to_shard
 from app.config import settings
 from app.auth.models import User
-from app.auth.jwt import create_access_token, TokenPayload, Token
+from app.auth.jwt import (
+    create_access_token,
+    decode_access_token,
+    TokenPayload,
+    Token,
+)
 
-router = APIRouter(prefix="/api", tags=["authentication"])
+router = APIRouter(prefix="/api", tags=["authentication"], route_class=ProfiledRoute)
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/login")
 
@@ -32,9 +40,11 @@ class UserResponse(BaseModel):
         orm_mode = True
 
 
-def get_current_user(
-    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
-) -> User:
+def user_claims(user: User) -> Dict[str, Any]:
+    return {"name": user.name, "email": user.email}
+
+
+def _authenticate(db: Session, token: str, load_user: bool = False) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -42,22 +52,49 @@ def get_current_user(
     )
 
     try:
-        payload = jwt.decode(
-            token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM]
-        )
+        payload = decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
 
-    user = db.query(User).filter(User.id == user_id).first()
-    if user is None:
-        raise credentials_exception
+    if not load_user and "name" in payload and "email" in payload:
+        # Endpoints only need what the token carries; a deleted user's
+        # token keeps working until it expires
+        user = User(id=user_id, name=payload["name"], email=payload["email"])
+    else:
+        # Tokens issued before the claims were added, and endpoints that
+        # issue tokens, which must not outlive the user
+        user = db.query(User).filter(User.id == user_id).first()
+        if user is None:
+            raise credentials_exception
 
+    # The user's progress and answers are read and written in their shard
+    route_to_shard(db, user.id)
     return user
 
 
+def get_current_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    return _authenticate(db, token)
+
+
+# For endpoints issuing tokens, always loads the user from the database
+def get_stored_user(
+    db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    return _authenticate(db, token, load_user=True)
+
+
+# For read-only endpoints, loads the user through the read session
+def get_current_reader(
+    db: Session = Depends(get_read_db), token: str = Depends(oauth2_scheme)
+) -> User:
+    return _authenticate(db, token)
+
+
 @router.post(
     "/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED
 )
@@ -111,7 +148,9 @@ def login(
     # Create access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=user.id, expires_delta=access_token_expires
+        subject=user.id,
+        expires_delta=access_token_expires,
+        claims=user_claims(user),
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
@@ -125,11 +164,13 @@ def logout():
 
 
 @router.post("/refresh-token", response_model=Token)
-def refresh_token(current_user: User = Depends(get_current_user)):
+def refresh_token(current_user: User = Depends(get_stored_user)):
     # Create new access token
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        subject=current_user.id, expires_delta=access_token_expires
+        subject=current_user.id,
+        expires_delta=access_token_expires,
+        claims=user_claims(current_user),
     )
 
     return {"access_token": access_token, "token_type": "bearer"}
@@ -0,0 +1,191 @@
+import threading
+import time
+
+from sqlalchemy import Column, Integer, func, inspect, select, text, update
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
+
+from app.database import Base, SessionLocal, engine
+from app.sharding import create_shard_tables, shard_engines
+
+# Bump SCHEMA_VERSION whenever a table or column is added. Seeding only
+# fills a database without questions and never changes existing ones, so
+# bumping SEED_VERSION only reaches databases that are still empty
+SCHEMA_VERSION = 4
+SEED_VERSION = 1
+
+# Serializes bootstrapping across workers; the PostgreSQL advisory lock id
+# is arbitrary but fixed
+BOOTSTRAP_LOCK_ID = 7_263_615_214
+BOOTSTRAP_LOCK_SECONDS = 600.0
+
+# Set once the in-process caches have been filled after startup
+caches_warm = threading.Event()
+
+
+class SchemaMeta(Base):
+    __tablename__ = "schema_meta"
+
+    id = Column(Integer, primary_key=True)
+    schema_version = Column(Integer, nullable=False, default=0)
+    seed_version = Column(Integer, nullable=False, default=0)
+
+
+def _add_column(conn, table: str, column: str, ddl: str) -> None:
+    # Tables created by create_all already have the column
+    if column not in {c["name"] for c in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+
+def _migrate_to_2(conn) -> None:
+    _add_column(conn, "user_progress", "version", "INTEGER NOT NULL DEFAULT 1")
+    _add_column(conn, "user_summaries", "etag", "VARCHAR")
+
+
+def _migrate_to_3(conn) -> None:
+    _add_column(conn, "user_progress", "attempt", "INTEGER NOT NULL DEFAULT 1")
+    _add_column(conn, "user_answers", "attempt", "INTEGER NOT NULL DEFAULT 1")
+
+    # Keep only the latest answer per question before enforcing uniqueness
+    conn.execute(
+        text(
+            """
+            DELETE FROM user_answers WHERE id NOT IN (
+                SELECT id FROM (
+                    SELECT id, ROW_NUMBER() OVER (
+                        PARTITION BY user_id, attempt, question_id
+                        ORDER BY timestamp DESC, sequence_number DESC, id DESC
+                    ) AS position
+                    FROM user_answers
+                ) ranked
+                WHERE position = 1
+            )
+            """
+        )
+    )
+    conn.execute(
+        text(
+            "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_answers_user_attempt_question"
+            " ON user_answers (user_id, attempt, question_id)"
+        )
+    )
+
+
+def _migrate_to_4(conn) -> None:
+    from app.questions.models import Question
+
+    _add_column(conn, "questions", "position", "INTEGER NOT NULL DEFAULT 0")
+
+    # Existing questionnaires start at the question no other one leads to
+    rows = conn.execute(select(Question.id, Question.next_question_mapping)).all()
+    referenced = {
+        target for _, mapping in rows for target in (mapping or {}).values() if target
+    }
+    conn.execute(update(Question).where(Question.id.in_(referenced)).values(position=1))
+
+
+# Schema version -> upgrade from the previous version
+MIGRATIONS = {
+    2: _migrate_to_2,
+    3: _migrate_to_3,
+    4: _migrate_to_4,
+}
+
+
+def _stored_versions():
+    # A single-row read; the table is missing on databases older than it
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(
+                select(SchemaMeta.schema_version, SchemaMeta.seed_version)
+            ).first()
+    except (OperationalError, ProgrammingError):
+        return 0, 0
+    return tuple(row) if row else (0, 0)
+
+
+def _is_current(schema_version: int, seed_version: int) -> bool:
+    return schema_version >= SCHEMA_VERSION and seed_version >= SEED_VERSION
+
+
+def _lock(conn) -> None:
+    # Held until the connection commits, so concurrently starting workers
+    # bootstrap one at a time and later ones find the database current
+    if conn.dialect.name == "postgresql":
+        conn.execute(select(func.pg_advisory_xact_lock(BOOTSTRAP_LOCK_ID)))
+    elif conn.dialect.name == "sqlite":
+        deadline = time.monotonic() + BOOTSTRAP_LOCK_SECONDS
+        while True:
+            try:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                return
+            except OperationalError:
+                # Another worker is bootstrapping beyond the busy timeout
+                if time.monotonic() > deadline:
+                    raise
+                conn.rollback()
+                time.sleep(0.1)
+
+
+def bootstrap_database() -> None:
+    # Shards are checked on every start, as one may have been added
+    if not shard_engines and _is_current(*_stored_versions()):
+        return
+
+    # Import every module that defines tables before creating them
+    import app.auth.models  # noqa: F401
+    import app.cache  # noqa: F401
+    from app.questions.seed import seed_questions
+
+    # Everything runs on the locked connection, which would otherwise block
+    # the other connections' writes
+    with engine.connect() as conn:
+        _lock(conn)
+        create_shard_tables()
+
+        schema_version, seed_version = 0, 0
+        if inspect(conn).has_table(SchemaMeta.__tablename__):
+            row = conn.execute(
+                select(SchemaMeta.schema_version, SchemaMeta.seed_version)
+            ).first()
+            schema_version, seed_version = tuple(row) if row else (0, 0)
+        if _is_current(schema_version, seed_version):
+            conn.commit()
+            return
+
+        if schema_version < SCHEMA_VERSION:
+            Base.metadata.create_all(bind=conn)
+            for version in range(max(schema_version, 1) + 1, SCHEMA_VERSION + 1):
+                MIGRATIONS[version](conn)
+
+        # Joins the connection's transaction; nothing is committed until the
+        # versions are stored
+        db = Session(bind=conn)
+        try:
+            if seed_version < SEED_VERSION:
+                seed_questions(db)
+
+            meta = db.get(SchemaMeta, 1) or SchemaMeta(id=1)
+            meta.schema_version = SCHEMA_VERSION
+            meta.seed_version = SEED_VERSION
+            db.merge(meta)
+            db.flush()
+        finally:
+            db.close()
+        conn.commit()
+
+
+def warm_caches() -> None:
+    from app.questions.cache import warm_question_cache
+    from app.questions.graph import GraphError
+
+    db = SessionLocal()
+    try:
+        warm_question_cache(db)
+    except GraphError as e:
+        # Never becomes ready, so a deploy with a broken graph is held back
+        print(e)
+        return
+    finally:
+        db.close()
+    caches_warm.set()
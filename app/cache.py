@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+import threading
+import time
+
+from sqlalchemy import Column, Integer, String, update
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Base
+
+
+class CacheVersion(Base):
+    __tablename__ = "cache_versions"
+
+    name = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+def bump_version(db: Session, name: str) -> None:
+    # Committed together with the caller's changes, so other workers only
+    # drop their caches once the new data is visible
+    result = db.execute(
+        update(CacheVersion)
+        .where(CacheVersion.name == name)
+        .values(version=CacheVersion.version + 1)
+    )
+    if result.rowcount == 0:
+        db.add(CacheVersion(name=name, version=1))
+
+
+class VersionedCache:
+    """Bounded in-process cache shared by one worker's threads.
+
+    Entries are dropped whenever the named version counter in the database
+    moves, which is how a change made on one worker reaches the others.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = 1024,
+        load_version: Optional[Callable[[Session], Hashable]] = None,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        # Caches whose data lives outside the main database supply their own
+        # version; by default it is the named row of cache_versions
+        self._load_version = load_version or self._load_cache_version
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: Optional[Hashable] = None
+        self._checked_at = 0.0
+
+    def _load_cache_version(self, db: Session) -> int:
+        return (
+            db.query(CacheVersion.version)
+            .filter(CacheVersion.name == self.name)
+            .scalar()
+        ) or 0
+
+    def _sync(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < settings.CACHE_VERSION_POLL_SECONDS:
+            return
+
+        version = self._load_version(db)
+
+        with self._lock:
+            if version != self._version:
+                self._data.clear()
+                self._version = version
+            self._checked_at = now
+
+    def get(self, db: Session, key: Hashable) -> Any:
+        self._sync(db)
+        with self._lock:
+            value = self._data.get(key)
+            if value is not None:
+                self._data.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            # Force the next lookup to re-read the shared version
+            self._checked_at = 0.0
+
+    def invalidate(self, db: Session) -> None:
+        bump_version(db, self.name)
+        self.clear()
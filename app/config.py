@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
+import os
 import secrets
 
 
@@ -8,16 +9,97 @@ class Settings(BaseSettings):
     API_V1_STR: str = "/api"
 
     # Security
-    SECRET_KEY: str = secrets.token_urlsafe(32)
+    SECRET_KEY: Optional[str] = None  # Read from SECRET_KEY_FILE when unset
+    SECRET_KEY_FILE: str = "./.secret_key"
+    PREVIOUS_SECRET_KEYS: List[str] = []  # Still accepted while rotating keys
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 1 day
+    VERIFIED_TOKEN_CACHE_SIZE: int = 10000  # Tokens not re-verified; 0 disables
 
     # Database
     DATABASE_URL: str = "sqlite:///./dynamic_questionnaire.db"
 
+    # Read-only endpoints use READ_REPLICA_URL, or else a read-only copy of
+    # the SQLite database at READ_REPLICA_SNAPSHOT_PATH (for local testing)
+    READ_REPLICA_URL: Optional[str] = None
+    READ_REPLICA_SNAPSHOT_PATH: Optional[str] = None
+    READ_REPLICA_SNAPSHOT_SECONDS: float = 5.0  # Snapshot refresh interval
+    READ_YOUR_WRITES_SECONDS: float = 0.0  # Read from the primary after a write
+
+    # Databases holding users' progress, answers and summaries, picked by a
+    # hash of the user id; empty keeps them in DATABASE_URL
+    SHARD_URLS: List[str] = []
+
+    # How often in-process caches check the shared version counters
+    CACHE_VERSION_POLL_SECONDS: float = 1.0
+
+    # Responses replayed for retried requests carrying an Idempotency-Key
+    IDEMPOTENCY_TTL_SECONDS: int = 60 * 60 * 24
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+
+    # Server-sent progress events
+    PROGRESS_STREAM_BUFFER: int = 16  # Undelivered events before a watcher is dropped
+    PROGRESS_STREAM_KEEPALIVE_SECONDS: float = 15.0
+
+    # Cross-tabs are limited to these user ids, and counts below the minimum
+    # cell size are withheld so single respondents can't be picked out
+    ANALYST_USER_IDS: List[str] = []
+    ANALYTICS_MIN_CELL_SIZE: int = 5
+    ANALYTICS_CACHE_SECONDS: float = 60.0  # How long cross-tabs are reused; 0 never
+
+    # Answers of completed attempts inactive this long move to ARCHIVE_DIR
+    ARCHIVE_DIR: str = "./archive"
+    ARCHIVE_AFTER_DAYS: int = 90
+
+    # Per-request profiling, off unless explicitly enabled
+    PROFILING_ENABLED: bool = False
+    PROFILING_HEADER: str = "X-Profile-Token"
+    PROFILING_TOKEN: Optional[str] = None  # Header value that forces a profile
+    PROFILING_SAMPLE_RATE: float = 0.0  # Fraction of other requests to profile
+    PROFILING_INTERVAL_SECONDS: float = 0.001
+    PROFILING_DIR: str = "./profiles"
+    PROFILING_MAX_FILES: int = 200  # Profiled requests kept in PROFILING_DIR
+
     class Config:
         env_file = ".env"
         case_sensitive = True
 
+    @property
+    def verification_keys(self) -> List[str]:
+        return [self.SECRET_KEY] + [
+            key for key in self.PREVIOUS_SECRET_KEYS if key != self.SECRET_KEY
+        ]
+
+
+def load_or_create_secret_key(path: str) -> str:
+    # Every worker process must sign with the same key, so it is generated
+    # once and shared through a file instead of being created per process
+    try:
+        with open(path) as key_file:
+            key = key_file.read().strip()
+        if key:
+            return key
+    except FileNotFoundError:
+        pass
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as key_file:
+        key_file.write(secrets.token_urlsafe(32))
+
+    try:
+        # Linking fails if another worker created the key first
+        os.link(tmp_path, path)
+    except FileExistsError:
+        pass
+    finally:
+        os.unlink(tmp_path)
+
+    with open(path) as key_file:
+        return key_file.read().strip()
+
 
 settings = Settings()
+
+if not settings.SECRET_KEY:
+    settings.SECRET_KEY = load_or_create_secret_key(settings.SECRET_KEY_FILE)
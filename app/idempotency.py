@@ -0,0 +1,173 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+import functools
+import hashlib
+import json
+import threading
+import time
+
+from fastapi import HTTPException, Response, status
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+
+from app.config import settings
+
+# How long a retry waits for the original request to finish
+IN_FLIGHT_WAIT_SECONDS = 10.0
+
+MAX_KEY_LENGTH = 255
+
+
+class StoredResponse(NamedTuple):
+    expires_at: float
+    fingerprint: str
+    status_code: int
+    body: bytes
+
+
+class IdempotencyStore:
+    """Bounded, expiring store of responses keyed by user and Idempotency-Key.
+
+    The store lives in the worker process, so a retry is only answered from
+    it when it reaches the worker that handled the original request.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: float):
+        self.maxsize = maxsize
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, str], StoredResponse]" = OrderedDict()
+        self._in_flight: Dict[Tuple[str, str], str] = {}
+        self._condition = threading.Condition()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def begin(self, key: Tuple[str, str], fingerprint: str) -> Optional[StoredResponse]:
+        """Return the stored response, or claim the key for a new request."""
+        deadline = time.monotonic() + IN_FLIGHT_WAIT_SECONDS
+        with self._condition:
+            while True:
+                entry = self._entries.get(key)
+                if entry is not None and entry.expires_at <= time.monotonic():
+                    del self._entries[key]
+                    self.expirations += 1
+                    entry = None
+
+                if entry is not None:
+                    self._check_fingerprint(entry.fingerprint, fingerprint)
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry
+
+                if key not in self._in_flight:
+                    self._in_flight[key] = fingerprint
+                    self.misses += 1
+                    return None
+
+                # The same key is still being processed by another request
+                self._check_fingerprint(self._in_flight[key], fingerprint)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise HTTPException(
+                        status_code=status.HTTP_409_CONFLICT,
+                        detail="A request with this Idempotency-Key is in progress",
+                    )
+                self._condition.wait(remaining)
+
+    def complete(self, key: Tuple[str, str], status_code: int, body: bytes) -> None:
+        with self._condition:
+            fingerprint = self._in_flight.pop(key)
+            self._entries[key] = StoredResponse(
+                time.monotonic() + self.ttl_seconds, fingerprint, status_code, body
+            )
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._condition.notify_all()
+
+    def abandon(self, key: Tuple[str, str]) -> None:
+        # Failed requests are not stored, so a retry runs them again
+        with self._condition:
+            self._in_flight.pop(key, None)
+            self._condition.notify_all()
+
+    @staticmethod
+    def _check_fingerprint(stored: str, received: str) -> None:
+        if stored != received:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="Idempotency-Key was already used for a different request",
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+idempotency_store = IdempotencyStore(
+    settings.IDEMPOTENCY_MAX_ENTRIES, settings.IDEMPOTENCY_TTL_SECONDS
+)
+
+
+def _fingerprint(endpoint: Callable, kwargs: Dict[str, Any]) -> str:
+    # Path parameters and the request body identify the request
+    request = {
+        name: jsonable_encoder(value)
+        for name, value in kwargs.items()
+        if name != "idempotency_key"
+        and isinstance(value, (BaseModel, str, int, float, bool))
+    }
+    payload = json.dumps([endpoint.__qualname__, request], sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def idempotent(endpoint: Callable) -> Callable:
+    """Replay the stored response when a request repeats its Idempotency-Key.
+
+    The endpoint must take ``idempotency_key`` (from the Idempotency-Key
+    header) and ``current_user`` as keyword parameters.
+    """
+
+    @functools.wraps(endpoint)
+    def idempotent_endpoint(*args, **kwargs):
+        idempotency_key = kwargs.get("idempotency_key")
+        if not idempotency_key:
+            return endpoint(*args, **kwargs)
+
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Idempotency-Key is too long",
+            )
+
+        key = (kwargs["current_user"].id, idempotency_key)
+        stored = idempotency_store.begin(key, _fingerprint(endpoint, kwargs))
+        if stored is not None:
+            return Response(
+                content=stored.body,
+                status_code=stored.status_code,
+                media_type="application/json",
+                headers={"Idempotent-Replayed": "true"},
+            )
+
+        try:
+            result = endpoint(*args, **kwargs)
+        except BaseException:
+            idempotency_store.abandon(key)
+            raise
+
+        body = json.dumps(jsonable_encoder(result)).encode()
+        idempotency_store.complete(key, status.HTTP_200_OK, body)
+        return result
+
+    return idempotent_endpoint
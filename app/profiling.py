@@ -0,0 +1,189 @@
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, List, Optional, Tuple
+import asyncio
+import functools
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+import uuid
+
+from fastapi.routing import APIRoute
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "current_profile", default=None
+)
+
+
+class RequestProfile:
+    """Stack samples and SQL statements collected for one profiled request."""
+
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.samples: Counter = Counter()
+        self.statements: List[Tuple[float, str]] = []
+        self.threads = set()
+        self.started = time.perf_counter()
+        self.duration = 0.0
+
+    def sample(self) -> None:
+        frames = sys._current_frames()
+        for thread_id in list(self.threads):
+            frame = frames.get(thread_id)
+            if frame is not None:
+                self.samples[_collapse(frame)] += 1
+
+    def write(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.path).strip("_") or "root"
+        stem = os.path.join(
+            directory, f"{int(time.time() * 1000)}-{self.method}-{slug}-{self.id}"
+        )
+
+        # One "frame;frame;frame count" line per stack, as flamegraph.pl expects
+        with open(f"{stem}.collapsed", "w") as output:
+            for stack, count in self.samples.most_common():
+                output.write(f"{stack} {count}\n")
+
+        with open(f"{stem}.sql", "w") as output:
+            output.write(
+                f"-- {self.method} {self.path}: {len(self.statements)} statements, "
+                f"{self.duration * 1000:.2f} ms total\n"
+            )
+            for elapsed, statement in self.statements:
+                output.write(f"-- {elapsed * 1000:.3f} ms\n{statement};\n")
+
+        _rotate(directory, settings.PROFILING_MAX_FILES)
+
+
+def _rotate(directory: str, max_profiles: int) -> None:
+    # Each profiled request leaves a .collapsed and a .sql file with the same
+    # stem, and stems start with a millisecond timestamp
+    stems = sorted({os.path.splitext(name)[0] for name in os.listdir(directory)})
+    for stem in stems[: max(len(stems) - max_profiles, 0)]:
+        for extension in (".collapsed", ".sql"):
+            try:
+                os.remove(os.path.join(directory, stem + extension))
+            except FileNotFoundError:
+                pass
+
+
+def _profiled(endpoint: Callable) -> Callable:
+    @functools.wraps(endpoint)
+    def profiled_endpoint(*args, **kwargs):
+        profile = _current_profile.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+
+        # Sync endpoints run in a threadpool thread; sample only that thread
+        thread_id = threading.get_ident()
+        profile.threads.add(thread_id)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.threads.discard(thread_id)
+
+    return profiled_endpoint
+
+
+_WRAPPER_CODE = _profiled(lambda: None).__code__
+
+
+def _collapse(frame) -> str:
+    stack = []
+    # Walk up to the endpoint wrapper, leaving out threadpool frames
+    while frame is not None and frame.f_code is not _WRAPPER_CODE:
+        code = frame.f_code
+        # co_qualname is new in Python 3.11
+        name = getattr(code, "co_qualname", code.co_name)
+        stack.append(f"{frame.f_globals.get('__name__', '?')}:{name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class ProfiledRoute(APIRoute):
+    def __init__(self, path: str, endpoint: Callable, **kwargs):
+        # Routes are left untouched unless profiling is switched on
+        if settings.PROFILING_ENABLED and not asyncio.iscoroutinefunction(endpoint):
+            endpoint = _profiled(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault("profile_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is not None and conn.info.get("profile_started"):
+        elapsed = time.perf_counter() - conn.info["profile_started"].pop()
+        profile.statements.append((elapsed, statement))
+
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.header = settings.PROFILING_HEADER.lower().encode()
+        self.token = settings.PROFILING_TOKEN
+        self.sample_rate = settings.PROFILING_SAMPLE_RATE
+        self.interval = settings.PROFILING_INTERVAL_SECONDS
+        self.directory = settings.PROFILING_DIR
+
+        # Attach to every engine, including any created later
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    def _should_profile(self, scope) -> bool:
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == self.header:
+                    return secrets.compare_digest(value, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        context_token = _current_profile.set(profile)
+
+        stopped = threading.Event()
+
+        def sample():
+            while not stopped.wait(self.interval):
+                profile.sample()
+
+        sampler = threading.Thread(target=sample, name="request-profiler", daemon=True)
+        sampler.start()
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode()))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        def finish():
+            sampler.join()
+            profile.write(self.directory)
+
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            stopped.set()
+            _current_profile.reset(context_token)
+            profile.duration = time.perf_counter() - profile.started
+            await asyncio.get_running_loop().run_in_executor(None, finish)
@@ -0,0 +1,82 @@
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.cache import VersionedCache
+from app.questions.etags import make_etag
+from app.questions.graph import QuestionGraph, compile_graph
+from app.questions.models import QUESTION_ORDER, Question, QuestionResponse
+
+# Questions only change when the questionnaire is reseeded, which bumps the
+# "questions" version so every worker reloads them
+question_cache = VersionedCache("questions")
+
+FIRST_QUESTION_KEY = ("first",)
+GRAPH_KEY = ("graph",)
+
+
+def _remember(db: Session, key, question: Optional[Question]) -> Optional[Question]:
+    if question is not None:
+        # Detach so later commits in this session don't expire the shared copy
+        db.expunge(question)
+        # Hash the content once, while caching, for conditional GETs
+        question.etag = make_etag(
+            QuestionResponse.model_validate(question).model_dump_json()
+        )
+        question_cache.set(key, question)
+    return question
+
+
+def ordered_questions(db: Session):
+    # The graph's root and the first question come from the same order
+    return db.query(Question).order_by(*QUESTION_ORDER)
+
+
+def load_question(db: Session, question_id: str) -> Optional[Question]:
+    question = question_cache.get(db, question_id)
+    if question is None:
+        question = db.query(Question).filter(Question.id == question_id).first()
+        _remember(db, question_id, question)
+    return question
+
+
+def load_first_question(db: Session) -> Optional[Question]:
+    question = question_cache.get(db, FIRST_QUESTION_KEY)
+    if question is None:
+        question = ordered_questions(db).first()
+        _remember(db, FIRST_QUESTION_KEY, question)
+    return question
+
+
+def _compiled_graph(db: Session) -> QuestionGraph:
+    graph = question_cache.get(db, GRAPH_KEY)
+    if graph is None:
+        graph = compile_graph(ordered_questions(db).all())
+        question_cache.set(GRAPH_KEY, graph)
+    return graph
+
+
+def load_graph(db: Session) -> QuestionGraph:
+    """The compiled question graph; raises GraphError when it is broken, so
+    answers are never routed through cycles or to missing questions."""
+    return _compiled_graph(db).check()
+
+
+def max_questions(db: Session) -> int:
+    # The most questions a user can answer; a broken graph has no longest
+    # path, so every question counts
+    graph = _compiled_graph(db)
+    return len(graph.mappings) if graph.problems else graph.longest_path
+
+
+def warm_question_cache(db: Session) -> None:
+    # Reading the first question also syncs the cache with the shared version
+    load_first_question(db)
+    questions = ordered_questions(db).all()
+    for question in questions:
+        _remember(db, question.id, question)
+
+    # Raises GraphError for a broken questionnaire
+    graph = compile_graph(questions)
+    question_cache.set(GRAPH_KEY, graph)
+    graph.check()
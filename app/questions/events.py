@@ -0,0 +1,135 @@
+from collections import defaultdict
+from typing import Any, Dict, Optional, Set
+import asyncio
+import threading
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import SessionLocal
+from app.questions.models import UserProgress
+from app.questions.summary import completion_percentage
+
+
+class Subscription:
+    def __init__(self, user_id: str, loop: asyncio.AbstractEventLoop, maxsize: int):
+        self.user_id = user_id
+        self.loop = loop
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.closed = False
+
+
+class ProgressBroker:
+    """In-process pub/sub of progress changes, one topic per user.
+
+    Each subscriber has a bounded buffer; one that falls behind is dropped
+    instead of letting undelivered events pile up in memory.
+    """
+
+    def __init__(self, buffer_size: int):
+        self.buffer_size = buffer_size
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def has_subscribers(self, user_id: str) -> bool:
+        return user_id in self._subscribers
+
+    def subscribe(self, user_id: str) -> Subscription:
+        # Called from the event loop that will consume the subscription
+        subscription = Subscription(
+            user_id, asyncio.get_running_loop(), self.buffer_size
+        )
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.closed = True
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def publish(self, user_id: str, payload: Dict[str, Any]) -> None:
+        # Safe to call from any thread
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(
+                    self._deliver, subscription, payload
+                )
+            except RuntimeError:
+                # The subscriber's event loop has shut down
+                self.unsubscribe(subscription)
+        self.published += 1
+
+    def _deliver(self, subscription: Subscription, payload: Dict[str, Any]) -> None:
+        if subscription.closed:
+            return
+        try:
+            subscription.queue.put_nowait(payload)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            subscribers = sum(len(s) for s in self._subscribers.values())
+        return {
+            "subscribers": subscribers,
+            "published": self.published,
+            "dropped_subscribers": self.dropped,
+        }
+
+
+progress_broker = ProgressBroker(settings.PROGRESS_STREAM_BUFFER)
+
+
+def progress_payload(db: Session, progress: UserProgress) -> Dict[str, Any]:
+    return {
+        "current_question_id": progress.current_question_id,
+        "completed_questions": list(progress.completed_questions or []),
+        "question_path": list(progress.question_path or []),
+        "is_completed": bool(progress.is_completed),
+        "completion_percentage": completion_percentage(db, progress),
+        "last_activity": (
+            progress.last_activity.isoformat() if progress.last_activity else None
+        ),
+    }
+
+
+# Progress rows changed by any request are captured when flushed and
+# published once the transaction commits, so watchers never see state that
+# is later rolled back
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_progress_changes(session: Session, flush_context) -> None:
+    for instance in list(session.new) + list(session.dirty):
+        if isinstance(instance, UserProgress) and progress_broker.has_subscribers(
+            instance.user_id
+        ):
+            pending = session.info.setdefault("progress_events", {})
+            pending[instance.user_id] = progress_payload(session, instance)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_progress_changes(session: Session) -> None:
+    pending: Optional[Dict[str, Dict[str, Any]]] = session.info.pop(
+        "progress_events", None
+    )
+    for user_id, payload in (pending or {}).items():
+        progress_broker.publish(user_id, payload)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_progress_changes(session: Session) -> None:
+    session.info.pop("progress_events", None)
+
+
+def changed_fields(previous: Dict[str, Any], current: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in current.items() if previous.get(key) != value}
@@ -0,0 +1,235 @@
+"""Compiler for the questionnaire's branching graph.
+
+Every question's ``next_question_mapping`` maps answers to the id of the
+next question, with ``"default"`` for any other answer and ``None`` for the
+end of the questionnaire. The first question is the root. Compiling the
+questions checks the graph for references to missing questions, cycles and
+questions no answer leads to. For a sound graph it counts the distinct paths
+from the root to the end of the questionnaire and the length of the longest
+one; the CLI can also list every path.
+
+Check the questions in the database, or in a JSON file of questions before
+seeding them, from the repository root:
+
+    python -m app.questions.graph [questions.json] [--paths]
+"""
+
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import argparse
+import json
+import sys
+
+from app.questions.models import Question
+
+
+class GraphError(ValueError):
+    def __init__(self, problems: List[str]):
+        super().__init__("Invalid question graph: " + "; ".join(problems))
+        self.problems = problems
+
+
+def _targets(mapping: Dict[str, Optional[str]]) -> List[str]:
+    # Distinct next question ids, in mapping order
+    return list(dict.fromkeys(value for value in mapping.values() if value))
+
+
+def _can_end(question: Question) -> bool:
+    # Whether some answer finishes the questionnaire at this question, as
+    # answers matching no key and with no default have no next question
+    mapping = question.next_question_mapping or {}
+    if any(value is None for value in mapping.values()):
+        return True
+    if "default" in mapping:
+        return False
+    if question.type != "single_choice" or not question.options:
+        return True
+    return any(str(option) not in mapping for option in question.options)
+
+
+class QuestionGraph:
+    """A compiled question graph.
+
+    ``problems`` lists everything wrong with the graph; ``order``,
+    ``path_count`` and ``longest_path`` are only filled in when it is empty.
+    """
+
+    def __init__(self, questions: Sequence[Question]):
+        self.root: Optional[str] = questions[0].id if questions else None
+        self.mappings: Dict[str, Dict[str, Optional[str]]] = {
+            question.id: dict(question.next_question_mapping or {})
+            for question in questions
+        }
+        self.edges = {
+            question_id: _targets(mapping)
+            for question_id, mapping in self.mappings.items()
+        }
+        self.ends = {question.id for question in questions if _can_end(question)}
+        self.problems: List[str] = []
+        self.order: List[str] = []  # Reachable questions, topologically sorted
+        self.path_count = 0
+        self.longest_path = 0  # Questions on the longest path
+
+        if self.root is None:
+            self.problems.append("There are no questions")
+            return
+        self._check_references()
+        reachable = self._check_reachability()
+        self._check_cycles(reachable)
+        if not self.problems:
+            self._sort(reachable)
+            self._measure()
+
+    def _check_references(self) -> None:
+        for question_id, mapping in self.mappings.items():
+            for answer, target in mapping.items():
+                if target and target not in self.mappings:
+                    self.problems.append(
+                        f"Question {question_id} maps answer {answer!r} to "
+                        f"missing question {target}"
+                    )
+
+    def _successors(self, question_id: str) -> List[str]:
+        return [t for t in self.edges[question_id] if t in self.mappings]
+
+    def _check_reachability(self) -> List[str]:
+        reachable, queue = {self.root: None}, deque([self.root])
+        while queue:
+            for target in self._successors(queue.popleft()):
+                if target not in reachable:
+                    reachable[target] = None
+                    queue.append(target)
+        for question_id in self.mappings:
+            if question_id not in reachable:
+                self.problems.append(
+                    f"Question {question_id} cannot be reached from {self.root}"
+                )
+        return list(reachable)
+
+    def _check_cycles(self, reachable: List[str]) -> None:
+        # Iterative depth-first search; an edge back to a question still on
+        # the stack closes a cycle
+        on_stack: Dict[str, int] = {}
+        done = set()
+        stack: List[str] = []
+        cycles = set()
+        for start in reachable:
+            if start in done:
+                continue
+            pending = [(start, iter(self._successors(start)))]
+            on_stack[start] = 0
+            stack.append(start)
+            while pending:
+                question_id, successors = pending[-1]
+                target = next(successors, None)
+                if target is None:
+                    pending.pop()
+                    del on_stack[stack.pop()]
+                    done.add(question_id)
+                elif target in on_stack:
+                    cycle = stack[on_stack[target] :]
+                    # Rotate so each cycle is reported once
+                    first = cycle.index(min(cycle))
+                    cycles.add(tuple(cycle[first:] + cycle[:first]))
+                elif target not in done:
+                    on_stack[target] = len(stack)
+                    stack.append(target)
+                    pending.append((target, iter(self._successors(target))))
+        for cycle in sorted(cycles):
+            self.problems.append("Cycle: " + " -> ".join(cycle + cycle[:1]))
+
+    def _sort(self, reachable: List[str]) -> None:
+        incoming = {question_id: 0 for question_id in reachable}
+        for question_id in reachable:
+            for target in self.edges[question_id]:
+                incoming[target] += 1
+        queue = deque([self.root])
+        while queue:
+            question_id = queue.popleft()
+            self.order.append(question_id)
+            for target in self.edges[question_id]:
+                incoming[target] -= 1
+                if incoming[target] == 0:
+                    queue.append(target)
+
+    def _measure(self) -> None:
+        # Counted over the sorted questions, as the number of paths can grow
+        # exponentially with the number of branches
+        counts: Dict[str, int] = {}
+        lengths: Dict[str, int] = {}
+        for question_id in reversed(self.order):
+            targets = self.edges[question_id]
+            counts[question_id] = int(question_id in self.ends) + sum(
+                counts[target] for target in targets
+            )
+            lengths[question_id] = 1 + max(
+                (lengths[target] for target in targets), default=0
+            )
+        self.path_count = counts[self.root]
+        self.longest_path = lengths[self.root]
+
+    def paths(self) -> Iterator[Tuple[str, ...]]:
+        """Every path from the root to the end, in mapping order."""
+        stack = [(self.root, (self.root,))]
+        while stack:
+            question_id, path = stack.pop()
+            if question_id in self.ends:
+                yield path
+            # Reversed, so paths come out in mapping order
+            for target in reversed(self.edges[question_id]):
+                stack.append((target, path + (target,)))
+
+    def check(self) -> "QuestionGraph":
+        if self.problems:
+            raise GraphError(self.problems)
+        return self
+
+    def next_question_id(self, question_id: str, answer_value: Any) -> Optional[str]:
+        """The question that follows ``answer_value``, None at the end."""
+        mapping = self.mappings.get(question_id, {})
+        answer = str(answer_value)
+        if answer in mapping:
+            return mapping[answer]
+        return mapping.get("default")
+
+
+def compile_graph(questions: Sequence[Question]) -> QuestionGraph:
+    return QuestionGraph(questions)
+
+
+def _load_file(path: str) -> List[Question]:
+    with open(path) as file:
+        return [Question(**item) for item in json.load(file)]
+
+
+def _load_database() -> List[Question]:
+    from app.database import SessionLocal
+
+    from app.questions.cache import ordered_questions
+
+    db = SessionLocal()
+    try:
+        return ordered_questions(db).all()
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "file", nargs="?", help="JSON list of questions; default is the database"
+    )
+    parser.add_argument("--paths", action="store_true", help="print every path")
+    args = parser.parse_args()
+
+    graph = compile_graph(_load_file(args.file) if args.file else _load_database())
+    print(f"Root: {graph.root}")
+    print(f"Questions: {len(graph.mappings)}")
+    if graph.problems:
+        for problem in graph.problems:
+            print(f"Error: {problem}")
+        sys.exit(1)
+    print(f"Paths: {graph.path_count} (longest {graph.longest_path} questions)")
+    if args.paths:
+        for path_id, path in enumerate(graph.paths()):
+            print(f"{path_id}: {' -> '.join(path)}")
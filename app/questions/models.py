@@ -1,4 +1,5 @@
 from sqlalchemy import (
+    event,
     Column,
     String,
     Boolean,
@@ -6,13 +7,14 @@ from sqlalchemy import (
     ForeignKey,
     Integer,
     DateTime,
+    Index,
     Text,
 )
 from sqlalchemy.ext.mutable import MutableList
 from datetime import datetime
 from sqlalchemy import String
 from sqlalchemy.sql import func
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, object_session
 import uuid
 from typing import List, Dict, Optional, Any, Union
 from pydantic import BaseModel
@@ -35,6 +37,11 @@ class Question(Base):
         JSON, nullable=False
     )  # Dict mapping answers to next question IDs
     validation_rules = Column(JSON, nullable=True)  # Dict with validation rules
+    position = Column(Integer, nullable=False, default=0)  # 0 starts the questionnaire
+
+
+# Questionnaire order; the first question is where every user starts
+QUESTION_ORDER = (Question.position, Question.id)
 
 
 class UserAnswer(Base):
@@ -49,10 +56,22 @@ class UserAnswer(Base):
     sequence_number = Column(
         Integer, nullable=False
     )  # Position in user's question sequence
+    attempt = Column(Integer, nullable=False, default=1)  # UserProgress.attempt
 
     # Relationships
     question = relationship("Question")
 
+    # One answer per question and attempt; answer writes upsert against it
+    __table_args__ = (
+        Index(
+            "ix_user_answers_user_attempt_question",
+            "user_id",
+            "attempt",
+            "question_id",
+            unique=True,
+        ),
+    )
+
 
 class UserProgress(Base):
     __tablename__ = "user_progress"
@@ -65,6 +84,25 @@ class UserProgress(Base):
     start_time = Column(DateTime, default=func.now())
     last_activity = Column(DateTime, default=func.now())
     is_completed = Column(Boolean, default=False)
+    version = Column(Integer, nullable=False, default=1)  # Bumped on every change
+    attempt = Column(Integer, nullable=False, default=1)  # Bumped on every restart
+
+
+@event.listens_for(UserProgress, "before_update")
+def _bump_progress_version(mapper, connection, target):
+    # Flushes of rows without net changes also pass through here
+    session = object_session(target)
+    if session is not None and session.is_modified(target):
+        target.version = (target.version or 0) + 1
+
+
+class UserSummary(Base):
+    __tablename__ = "user_summaries"
+
+    user_id = Column(String, ForeignKey("users.id"), primary_key=True)
+    payload = Column(Text, nullable=False)  # Pre-rendered SummaryResponse JSON
+    etag = Column(String, nullable=True)
+    created_at = Column(DateTime, default=func.now())
 
 
 class QuestionPath(Base):
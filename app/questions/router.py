@@ -1,16 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Depends,
+    Header,
+    HTTPException,
+    Response,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any, Optional
 from datetime import datetime
+import asyncio
+import json
 
+from app.config import settings
 from app.database import get_db
-from app.auth.router import get_current_user
+from app.replica import get_read_db
+from app.idempotency import idempotent
+from app.answers.archive import restore_archived_answers
+from app.answers.storage import delete_answers, upsert_answer
+from app.profiling import ProfiledRoute
+from app.auth.router import get_current_reader, get_current_user
 from app.auth.models import User
 from app.questions.models import (
-    Question,
     UserAnswer,
     UserProgress,
     QuestionPath,
+    UserSummary,
     QuestionResponse,
     AnswerCreate,
     AnswerResponse,
@@ -18,8 +36,40 @@ from app.questions.models import (
     ProgressResponse,
     SummaryResponse,
 )
+from app.questions.cache import (
+    load_graph,
+    load_question,
+    load_first_question,
+    max_questions,
+)
+from app.questions.etags import (
+    CACHE_HEADERS,
+    etag_matches,
+    not_modified,
+    progress_etag,
+)
+from app.questions.graph import GraphError, QuestionGraph
+from app.questions.events import changed_fields, progress_broker, progress_payload
+from app.questions.summary import (
+    build_summary,
+    summary_etag,
+    invalidate_summary,
+    materialize_summary,
+)
 
-router = APIRouter(prefix="/api", tags=["questionnaire"])
+router = APIRouter(prefix="/api", tags=["questionnaire"], route_class=ProfiledRoute)
+
+
+def _load_graph(db: Session) -> QuestionGraph:
+    # Loaded before any write, so a broken questionnaire changes nothing
+    try:
+        return load_graph(db)
+    except GraphError as e:
+        print(e)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Questionnaire is misconfigured",
+        )
 
 
 # Get initial question
@@ -34,16 +84,18 @@ def get_initial_question(
 
     if progress and progress.is_completed:
         # If questionnaire is completed, delete all answers and start fresh
-        db.query(UserAnswer).filter(UserAnswer.user_id == current_user.id).delete()
+        delete_answers(db, current_user.id)
+        invalidate_summary(db, current_user.id)
         progress.completed_questions = []
         progress.question_path = []
         progress.is_completed = False
+        progress.attempt = (progress.attempt or 1) + 1
         progress.start_time = datetime.now()
         progress.last_activity = datetime.now()
         db.commit()
 
     # Get the first question
-    first_question = db.query(Question).first()
+    first_question = load_first_question(db)
 
     if not first_question:
         raise HTTPException(
@@ -74,33 +126,45 @@ def get_initial_question(
 @router.get("/questions/{question_id}", response_model=QuestionResponse)
 def get_question(
     question_id: str,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    response: Response,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+    if_none_match: Optional[str] = Header(None),
 ):
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = load_question(db, question_id)
 
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Question not found"
         )
 
+    # The content hash is computed once, when the question is cached
+    if etag_matches(if_none_match, question.etag):
+        return not_modified(question.etag)
+
+    response.headers.update({"ETag": question.etag, **CACHE_HEADERS})
     return question
 
 
 # Submit answer and get next question
 @router.post("/answers", response_model=NextQuestionResponse)
+@idempotent
 def submit_answer(
     answer_data: AnswerCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
 ):
     # Get the question
-    question = db.query(Question).filter(Question.id == answer_data.question_id).first()
+    question = load_question(db, answer_data.question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Question not found"
         )
 
+    graph = _load_graph(db)
+
     # Get user progress
     progress = (
         db.query(UserProgress).filter(UserProgress.user_id == current_user.id).first()
@@ -110,6 +174,11 @@ def submit_answer(
             status_code=status.HTTP_404_NOT_FOUND, detail="User progress not found"
         )
 
+    # A completed attempt's answers may have moved to the archive; bring
+    # them back before changing it
+    if progress.is_completed:
+        restore_archived_answers(db, current_user.id, progress.attempt)
+
     # Check if the answer is correct (if applicable)
     is_correct = None
     if question.correct_answer is not None:
@@ -118,15 +187,16 @@ def submit_answer(
     # Get sequence number (position in user's question path)
     sequence_number = len(progress.completed_questions) + 1
 
-    # Store the answer
-    user_answer = UserAnswer(
+    # Store the answer, replacing an earlier answer to the same question
+    upsert_answer(
+        db,
         user_id=current_user.id,
+        attempt=progress.attempt,
         question_id=question.id,
         answer_value=answer_data.answer_value,
         is_correct=is_correct,
         sequence_number=sequence_number,
     )
-    db.add(user_answer)
 
     # Update progress - Add question to completed questions
     if str(question.id) not in progress.completed_questions:
@@ -134,35 +204,33 @@ def submit_answer(
     progress.last_activity = datetime.now()
 
     # Determine next question based on answer
-    next_question_id = None
-    answer_str = str(answer_data.answer_value)
-
-    if answer_str in question.next_question_mapping:
-        next_question_id = question.next_question_mapping[answer_str]
-    elif "default" in question.next_question_mapping:
-        next_question_id = question.next_question_mapping["default"]
+    next_question_id = graph.next_question_id(
+        question.id, answer_data.answer_value
+    )
 
     # Check if there's a next question or if this is the last one
     is_last = False
     next_question = None
 
     if next_question_id:
-        next_question = (
-            db.query(Question).filter(Question.id == next_question_id).first()
-        )
+        next_question = load_question(db, next_question_id)
         if next_question:
             progress.current_question_id = next_question.id
             if str(next_question.id) not in progress.question_path:
                 progress.question_path.append(str(next_question.id))
 
-    # If there's no next question or we've reached the limit (10 questions), mark as completed
-    if not next_question or len(progress.completed_questions) >= 10:
+    # load_graph rejects graphs with cycles, so every path ends without a cap
+    if not next_question:
         progress.is_completed = True
         progress.current_question_id = None
         is_last = True
 
     db.commit()
 
+    # Build the summary once, after the completing answer is committed
+    if progress.is_completed:
+        background_tasks.add_task(materialize_summary, current_user.id)
+
     next_question_data = (
         QuestionResponse.from_orm(next_question) if next_question else None
     )
@@ -172,19 +240,24 @@ def submit_answer(
 
 # Update answer for a specific question
 @router.put("/answers/{question_id}", response_model=NextQuestionResponse)
+@idempotent
 def update_answer(
     question_id: str,
     answer_data: AnswerCreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None),
 ):
     # Validate question
-    question = db.query(Question).filter(Question.id == question_id).first()
+    question = load_question(db, question_id)
     if not question:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Question not found"
         )
 
+    graph = _load_graph(db)
+
     # Get user progress
     progress = (
         db.query(UserProgress).filter(UserProgress.user_id == current_user.id).first()
@@ -194,42 +267,6 @@ def update_answer(
             status_code=status.HTTP_404_NOT_FOUND, detail="User progress not found"
         )
 
-    # Find the existing answer
-    user_answer = (
-        db.query(UserAnswer)
-        .filter(
-            UserAnswer.user_id == current_user.id, UserAnswer.question_id == question_id
-        )
-        .first()
-    )
-
-    # Update or create answer
-    if user_answer:
-        # Check if the answer is correct (if applicable)
-        if question.correct_answer is not None:
-            user_answer.is_correct = answer_data.answer_value == question.correct_answer
-
-        user_answer.answer_value = answer_data.answer_value
-        user_answer.timestamp = datetime.now()
-    else:
-        # Get sequence number
-        sequence_number = progress.question_path.index(question_id) + 1
-
-        # Create new answer
-        is_correct = None
-        if question.correct_answer is not None:
-            is_correct = answer_data.answer_value == question.correct_answer
-
-        user_answer = UserAnswer(
-            user_id=current_user.id,
-            question_id=question.id,
-            answer_value=answer_data.answer_value,
-            is_correct=is_correct,
-            sequence_number=sequence_number,
-        )
-        db.add(user_answer)
-
-    # Recalculate question flow from this point forward
     # Get the index of the current question in the path
     try:
         current_index = progress.question_path.index(question_id)
@@ -239,6 +276,28 @@ def update_answer(
             detail="Question not found in user's path",
         )
 
+    # A completed attempt's answers may have moved to the archive; bring
+    # them back before changing it
+    if progress.is_completed:
+        restore_archived_answers(db, current_user.id, progress.attempt)
+
+    # Check if the answer is correct (if applicable)
+    is_correct = None
+    if question.correct_answer is not None:
+        is_correct = answer_data.answer_value == question.correct_answer
+
+    # Update or create the answer in a single statement
+    upsert_answer(
+        db,
+        user_id=current_user.id,
+        attempt=progress.attempt,
+        question_id=question.id,
+        answer_value=answer_data.answer_value,
+        is_correct=is_correct,
+        sequence_number=current_index + 1,
+    )
+
+    # Recalculate question flow from this point forward
     # Keep only the questions up to and including the current one
     progress.question_path = progress.question_path[: current_index + 1]
 
@@ -252,23 +311,20 @@ def update_answer(
     # Update last activity
     progress.last_activity = datetime.now()
 
-    # Determine next question based on the new answer
-    next_question_id = None
-    answer_str = str(answer_data.answer_value)
+    # Any stored summary no longer reflects the user's answers
+    invalidate_summary(db, current_user.id)
 
-    if answer_str in question.next_question_mapping:
-        next_question_id = question.next_question_mapping[answer_str]
-    elif "default" in question.next_question_mapping:
-        next_question_id = question.next_question_mapping["default"]
+    # Determine next question based on the new answer
+    next_question_id = graph.next_question_id(
+        question.id, answer_data.answer_value
+    )
 
     # Check if there's a next question
     is_last = False
     next_question = None
 
     if next_question_id:
-        next_question = (
-            db.query(Question).filter(Question.id == next_question_id).first()
-        )
+        next_question = load_question(db, next_question_id)
         if next_question:
             progress.current_question_id = next_question.id
             progress.question_path.append(str(next_question.id))
@@ -280,6 +336,9 @@ def update_answer(
 
     db.commit()
 
+    if progress.is_completed:
+        background_tasks.add_task(materialize_summary, current_user.id)
+
     return NextQuestionResponse(question=next_question, is_last=is_last)
 
 
@@ -323,11 +382,7 @@ def get_previous_question(
     previous_question_id = progress.question_path[current_index - 1]
 
     # Get the previous question
-    previous_question = (
-        db.query(Question)
-        .filter(Question.id == previous_question_id)
-        .first()
-    )
+    previous_question = load_question(db, previous_question_id)
 
     if not previous_question:
         raise HTTPException(
@@ -335,10 +390,16 @@ def get_previous_question(
             detail="Previous question not found"
         )
 
+    # A completed attempt's answers may have moved to the archive; bring
+    # them back before changing it
+    if progress.is_completed:
+        restore_archived_answers(db, current_user.id, progress.attempt)
+
     # Update progress to point to the previous question
     progress.current_question_id = previous_question.id
     progress.question_path = progress.question_path[:current_index]
     progress.is_completed = False
+    invalidate_summary(db, current_user.id)
     db.commit()
 
     return previous_question
@@ -347,8 +408,23 @@ def get_previous_question(
 # Get user progress
 @router.get("/progress", response_model=ProgressResponse)
 def get_progress(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user),
+    if_none_match: Optional[str] = Header(None),
 ):
+    # Revalidate against the progress version without loading anything else
+    if if_none_match:
+        version = (
+            db.query(UserProgress.version)
+            .filter(UserProgress.user_id == current_user.id)
+            .scalar()
+        )
+        if version is not None:
+            etag = progress_etag("progress", current_user.id, version)
+            if etag_matches(if_none_match, etag):
+                return not_modified(etag)
+
     # Get user progress
     progress = (
         db.query(UserProgress).filter(UserProgress.user_id == current_user.id).first()
@@ -359,37 +435,41 @@ def get_progress(
             status_code=status.HTTP_404_NOT_FOUND, detail="User progress not found"
         )
 
-    # Get all answers for completed questions
+    # Get all answers for completed questions in a single query
     answers = {}
-    for question_id in progress.completed_questions:
-        answer = (
-            db.query(UserAnswer)
+    if progress.completed_questions:
+        completed_answers = (
+            db.query(UserAnswer.question_id, UserAnswer.answer_value)
             .filter(
                 UserAnswer.user_id == current_user.id,
-                UserAnswer.question_id == question_id,
+                UserAnswer.attempt == progress.attempt,
+                UserAnswer.question_id.in_(progress.completed_questions),
             )
-            .first()
+            .order_by(UserAnswer.timestamp)
+            .all()
         )
-        if answer:
-            answers[question_id] = answer.answer_value
+        for question_id, answer_value in completed_answers:
+            answers[question_id] = answer_value
 
     # Calculate completion percentage based on completed questions
-    total_questions = 10  # Fixed total questions
-    completed = len(progress.completed_questions)
-    completion_percentage = (completed / total_questions) * 100
+    total_questions = max_questions(db)
+    completion_percentage = (len(progress.completed_questions) / total_questions) * 100
 
-    # Ensure we have all 10 questions in the path
+    # Ensure the path reaches as far as the questionnaire can
     if len(progress.question_path) < total_questions:
         # Get the next questions based on the last answer
         last_question_id = progress.question_path[-1] if progress.question_path else None
         if last_question_id:
-            last_question = db.query(Question).filter(Question.id == last_question_id).first()
+            last_question = load_question(db, last_question_id)
             if last_question and last_question.next_question_mapping:
                 next_question_id = last_question.next_question_mapping.get("default")
                 if next_question_id and next_question_id not in progress.question_path:
                     progress.question_path.append(next_question_id)
                     db.commit()
 
+    etag = progress_etag("progress", progress.user_id, progress.version)
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+
     return {
         "completed_questions": progress.completed_questions,
         "question_path": progress.question_path,
@@ -403,11 +483,96 @@ def get_progress(
     }
 
 
+# Stream progress changes as server-sent events
+@router.get("/progress/stream")
+async def stream_progress(
+    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+):
+    user_id = current_user.id
+    # Subscribe before reading the snapshot so no change can slip between them
+    subscription = progress_broker.subscribe(user_id)
+
+    def load_snapshot():
+        try:
+            progress = (
+                db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+            )
+            return progress_payload(db, progress) if progress else None
+        finally:
+            # Don't hold a pooled connection for the lifetime of the stream
+            db.close()
+
+    try:
+        snapshot = await run_in_threadpool(load_snapshot)
+    except BaseException:
+        progress_broker.unsubscribe(subscription)
+        raise
+
+    if snapshot is None:
+        progress_broker.unsubscribe(subscription)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User progress not found"
+        )
+
+    async def events():
+        previous = snapshot
+        try:
+            yield f"event: progress\ndata: {json.dumps(snapshot)}\n\n"
+            while not subscription.closed:
+                try:
+                    current = await asyncio.wait_for(
+                        subscription.queue.get(),
+                        settings.PROGRESS_STREAM_KEEPALIVE_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+
+                delta = changed_fields(previous, current)
+                previous = current
+                if delta:
+                    yield f"event: progress\ndata: {json.dumps(delta)}\n\n"
+        finally:
+            progress_broker.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 # Get summary of user's answers
 @router.get("/summary", response_model=SummaryResponse)
 def get_summary(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    response: Response,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
+    if_none_match: Optional[str] = Header(None),
 ):
+    # The progress version and any materialized summary, in one query
+    current = (
+        db.query(UserProgress.version, UserSummary.etag, UserSummary.payload)
+        .outerjoin(UserSummary, UserSummary.user_id == UserProgress.user_id)
+        .filter(UserProgress.user_id == current_user.id)
+        .first()
+    )
+    if current is not None:
+        # Revalidate against the progress version without loading any answers
+        etag = progress_etag("summary", current_user.id, current.version)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        # A stored summary is only served while it matches the progress it
+        # was built from; progress may have changed while it was stored
+        if current.etag == etag:
+            return Response(
+                content=current.payload,
+                media_type="application/json",
+                headers={"ETag": etag, **CACHE_HEADERS},
+            )
+
     # Get user progress
     progress = (
         db.query(UserProgress).filter(UserProgress.user_id == current_user.id).first()
@@ -418,45 +583,22 @@ def get_summary(
             status_code=status.HTTP_404_NOT_FOUND, detail="User progress not found"
         )
 
-    # Get all user answers
-    user_answers = (
-        db.query(UserAnswer)
-        .filter(UserAnswer.user_id == current_user.id)
-        .order_by(UserAnswer.sequence_number)
-        .all()
-    )
-
-    # Format the answers with question text
-    formatted_answers = []
-    for answer in user_answers:
-        question = db.query(Question).filter(Question.id == answer.question_id).first()
-        formatted_answers.append(
-            {
-                "question_id": str(answer.question_id),
-                "question_text": question.text if question else "Unknown Question",
-                "answer_value": answer.answer_value,
-                "is_correct": answer.is_correct,
-                "sequence_number": answer.sequence_number,
-            }
-        )
-
-    # Calculate completion percentage
-    total_questions = 10
-    completed = len(progress.completed_questions)
-    completion_percentage = (completed / total_questions) * 100
+    # Rebuild on cache miss; the result is stored through the primary once
+    # it can no longer change, as this session may be bound to a replica
+    summary = build_summary(db, progress)
+    etag = summary_etag(progress)
+    if progress.is_completed:
+        background_tasks.add_task(materialize_summary, current_user.id)
 
-    return {
-        "user_answers": formatted_answers,
-        "start_time": progress.start_time,
-        "completion_time": progress.last_activity if progress.is_completed else None,
-        "completion_percentage": completion_percentage,
-    }
+    response.headers.update({"ETag": etag, **CACHE_HEADERS})
+    return summary
 
 
 # Get user's full question path history
 @router.get("/question-history", response_model=List[str])
 def get_question_history(
-    db: Session = Depends(get_db), current_user: User = Depends(get_current_user)
+    db: Session = Depends(get_read_db),
+    current_user: User = Depends(get_current_reader),
 ):
     # Get user progress
     progress = (
@@ -0,0 +1,115 @@
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.answers.archive import load_archived_answers
+from app.database import SessionLocal
+from app.sharding import route_to_shard
+from app.questions.etags import progress_etag
+from app.questions.cache import load_question, max_questions
+from app.questions.models import (
+    UserAnswer,
+    UserProgress,
+    UserSummary,
+    SummaryResponse,
+)
+
+
+def completion_percentage(db: Session, progress: UserProgress) -> float:
+    # Relative to the longest path through the questionnaire
+    completed = len(progress.completed_questions or [])
+    return (completed / max_questions(db)) * 100
+
+
+def _question_text(db: Session, question_id: str) -> str:
+    question = load_question(db, question_id)
+    return question.text if question else "Unknown Question"
+
+
+def build_summary(db: Session, progress: UserProgress) -> SummaryResponse:
+    # Question texts come from the question cache rather than a join, as
+    # answers may be stored in a shard without the questions table
+    answers = (
+        db.query(UserAnswer)
+        .filter(
+            UserAnswer.user_id == progress.user_id,
+            UserAnswer.attempt == progress.attempt,
+        )
+        .order_by(UserAnswer.sequence_number)
+        .all()
+    )
+
+    formatted_answers = [
+        {
+            "question_id": str(answer.question_id),
+            "question_text": _question_text(db, answer.question_id),
+            "answer_value": answer.answer_value,
+            "is_correct": answer.is_correct,
+            "sequence_number": answer.sequence_number,
+        }
+        for answer in answers
+    ]
+
+    # Answers of old completed attempts may have moved to the archive
+    if not answers and progress.is_completed:
+        formatted_answers = [
+            {
+                "question_id": answer["question_id"],
+                "question_text": _question_text(db, answer["question_id"]),
+                "answer_value": answer["answer_value"],
+                "is_correct": answer["is_correct"],
+                "sequence_number": answer["sequence_number"],
+            }
+            for answer in load_archived_answers(progress.user_id, progress.attempt) or []
+        ]
+
+    return SummaryResponse(
+        user_answers=formatted_answers,
+        start_time=progress.start_time,
+        completion_time=progress.last_activity if progress.is_completed else None,
+        completion_percentage=completion_percentage(db, progress),
+    )
+
+
+def summary_etag(progress: UserProgress) -> str:
+    return progress_etag("summary", progress.user_id, progress.version)
+
+
+def store_summary(
+    db: Session, progress: UserProgress, summary: SummaryResponse
+) -> None:
+    db.merge(
+        UserSummary(
+            user_id=progress.user_id,
+            payload=summary.model_dump_json(),
+            etag=summary_etag(progress),
+        )
+    )
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request materialized the same summary first
+        db.rollback()
+
+
+def invalidate_summary(db: Session, user_id: str) -> None:
+    # Flushed together with the caller's own commit
+    db.query(UserSummary).filter(UserSummary.user_id == user_id).delete(
+        synchronize_session=False
+    )
+
+
+def materialize_summary(user_id: str) -> None:
+    # Runs as a background task once the completing request has committed
+    db = SessionLocal()
+    route_to_shard(db, user_id)
+    try:
+        progress = (
+            db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+        )
+        # The user may have navigated back or restarted in the meantime
+        if not progress or not progress.is_completed:
+            return
+
+        store_summary(db, progress, build_summary(db, progress))
+    finally:
+        db.close()
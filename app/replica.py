@@ -0,0 +1,175 @@
+"""Routing of read-only requests to a read replica.
+
+Endpoints that only read take their session from ``get_read_db``. With
+READ_REPLICA_URL set, that session is bound to the replica. For local
+testing, READ_REPLICA_SNAPSHOT_PATH instead serves reads from a read-only
+copy of the primary SQLite file, refreshed every
+READ_REPLICA_SNAPSHOT_SECONDS, which behaves like a lagging replica.
+Without either setting reads use the primary.
+
+A replica may not have caught up with a user's own latest write yet. With
+READ_YOUR_WRITES_SECONDS above zero, a user whose changes were committed
+within that window reads from the primary instead. Recent writers are
+tracked per worker process, like the idempotency store.
+"""
+
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+import sqlite3
+import threading
+import time
+
+from fastapi import Request
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.config import settings
+from app.database import SessionLocal, engine, make_engine
+
+MAX_RECENT_WRITERS = 100_000
+
+
+class RecentWriters:
+    """Users whose own changes were committed within the last few seconds."""
+
+    def __init__(self, window_seconds: float, maxsize: int):
+        self.window_seconds = window_seconds
+        self.maxsize = maxsize
+        self._committed_at: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, user_id: str) -> None:
+        with self._lock:
+            self._committed_at[user_id] = time.monotonic()
+            self._committed_at.move_to_end(user_id)
+            while len(self._committed_at) > self.maxsize:
+                self._committed_at.popitem(last=False)
+
+    def wrote_recently(self, user_id: str) -> bool:
+        with self._lock:
+            committed_at = self._committed_at.get(user_id)
+            if committed_at is None:
+                return False
+            if time.monotonic() - committed_at < self.window_seconds:
+                return True
+            del self._committed_at[user_id]
+            return False
+
+    def __len__(self) -> int:
+        return len(self._committed_at)
+
+
+recent_writers = RecentWriters(settings.READ_YOUR_WRITES_SECONDS, MAX_RECENT_WRITERS)
+
+# Reads served by each database, for /metrics
+routed = {"replica": 0, "primary": 0, "read_your_writes": 0}
+
+
+def _snapshot_url(path: str) -> str:
+    return f"sqlite:///file:{path}?mode=ro&uri=true"
+
+
+def refresh_snapshot() -> None:
+    # The backup API copies a consistent state even while the primary is
+    # being written, and readers of the copy see either the old or new state
+    source = sqlite3.connect(engine.url.database)
+    target = sqlite3.connect(settings.READ_REPLICA_SNAPSHOT_PATH)
+    try:
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+
+
+def _refresh_snapshots() -> None:
+    while True:
+        time.sleep(settings.READ_REPLICA_SNAPSHOT_SECONDS)
+        try:
+            refresh_snapshot()
+        except sqlite3.Error as e:
+            print(f"Refreshing the read snapshot failed: {e}")
+
+
+def start_read_replica() -> None:
+    # Called on startup, before any read is routed to the snapshot
+    if not settings.READ_REPLICA_URL and settings.READ_REPLICA_SNAPSHOT_PATH:
+        refresh_snapshot()
+        if settings.READ_REPLICA_SNAPSHOT_SECONDS > 0:
+            threading.Thread(
+                target=_refresh_snapshots, name="snapshot-refresher", daemon=True
+            ).start()
+
+
+read_engine = None
+if settings.READ_REPLICA_URL:
+    read_engine = make_engine(settings.READ_REPLICA_URL)
+elif settings.READ_REPLICA_SNAPSHOT_PATH:
+    if engine.dialect.name != "sqlite":
+        raise RuntimeError("READ_REPLICA_SNAPSHOT_PATH needs a SQLite DATABASE_URL")
+    read_engine = make_engine(_snapshot_url(settings.READ_REPLICA_SNAPSHOT_PATH))
+
+ReadSessionLocal: Optional[sessionmaker] = None
+if read_engine is not None:
+    ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+
+def _token_subject(request: Request) -> Optional[str]:
+    # Only picks the database; the token is verified when authenticating
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return jwt.get_unverified_claims(token).get("sub")
+    except JWTError:
+        return None
+
+
+# Dependency to get a session for read-only endpoints
+def get_read_db(request: Request):
+    if ReadSessionLocal is None:
+        route = "primary"
+    elif settings.READ_YOUR_WRITES_SECONDS > 0 and recent_writers.wrote_recently(
+        _token_subject(request) or ""
+    ):
+        route = "read_your_writes"
+    else:
+        route = "replica"
+    routed[route] += 1
+
+    db = ReadSessionLocal() if route == "replica" else SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def stats() -> Dict[str, int]:
+    return {**routed, "recent_writers": len(recent_writers)}
+
+
+# Users are remembered as writers once their changes are committed; every
+# write a user makes flushes one of their own rows
+@event.listens_for(SessionLocal, "after_flush")
+def _capture_writers(session: Session, flush_context) -> None:
+    if settings.READ_YOUR_WRITES_SECONDS <= 0 or read_engine is None:
+        return
+    from app.auth.models import User
+
+    writers: Set[str] = session.info.setdefault("writers", set())
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        user_id = instance.id if isinstance(instance, User) else None
+        user_id = user_id or getattr(instance, "user_id", None)
+        if user_id:
+            writers.add(user_id)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _record_writers(session: Session) -> None:
+    for user_id in session.info.pop("writers", ()):
+        recent_writers.record(user_id)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_writers(session: Session) -> None:
+    session.info.pop("writers", None)
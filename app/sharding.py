@@ -0,0 +1,199 @@
+"""Hash sharding of per-user questionnaire data.
+
+With SHARD_URLS set, each user's progress, answers and summary live in one
+of those databases, chosen from a hash of the user id. Questions, users and
+cache versions stay in the common database at DATABASE_URL. Every shard has
+its own engine and connection pool.
+
+A session is routed to a user's shard with ``route_to_shard`` once the user
+is known, which authentication does for every request. Sharded models are
+then read and written through the shard, everything else through the
+session's own bind. A commit touching both databases is not atomic across
+them. Without SHARD_URLS everything stays in the common database.
+
+Shards are picked with jump consistent hashing, so appending a shard to
+SHARD_URLS only moves about 1/N of the users. Move them with the app
+stopped, from the repository root:
+
+    python -m app.sharding rebalance
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+import argparse
+import hashlib
+import sys
+
+from sqlalchemy import delete, insert, inspect, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateTable
+
+from app.config import settings
+from app.database import engine, make_engine
+from app.questions.models import UserAnswer, UserProgress, UserSummary
+
+# Models stored in the user's shard; the rest are common
+SHARDED_MODELS = (UserProgress, UserAnswer, UserSummary)
+USER_MODELS = SHARDED_MODELS
+
+shard_engines: List[Engine] = [make_engine(url) for url in settings.SHARD_URLS]
+
+
+def _jump_hash(key: int, buckets: int) -> int:
+    # Lamping & Veach, "A Fast, Minimal Memory, Consistent Hash Algorithm"
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) % 2**64
+        candidate = int((bucket + 1) * (2**31 / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(user_id: str, shards: Optional[int] = None) -> int:
+    digest = hashlib.blake2b(user_id.encode(), digest_size=8).digest()
+    return _jump_hash(int.from_bytes(digest, "big"), shards or len(shard_engines))
+
+
+def route_to_shard(db: Session, user_id: str) -> None:
+    if shard_engines:
+        shard = shard_engines[shard_for(user_id)]
+        for model in SHARDED_MODELS:
+            db.bind_mapper(model, shard)
+
+
+@contextmanager
+def shard_session(index: int) -> Iterator[Session]:
+    session = Session(
+        bind=engine, binds={model: shard_engines[index] for model in SHARDED_MODELS}
+    )
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def each_shard(db: Session) -> Iterator[Session]:
+    """Sessions covering every user's sharded rows, ``db`` when unsharded."""
+    if not shard_engines:
+        yield db
+        return
+    for index in range(len(shard_engines)):
+        with shard_session(index) as session:
+            yield session
+
+
+def create_shard_tables() -> None:
+    # Shards hold no users or questions, so their foreign keys are left out
+    for shard in shard_engines:
+        with shard.begin() as conn:
+            existing = set(inspect(conn).get_table_names())
+            for model in SHARDED_MODELS:
+                table = model.__table__
+                if table.name in existing:
+                    continue
+                conn.execute(CreateTable(table, include_foreign_key_constraints=[]))
+                for index in table.indexes:
+                    index.create(conn)
+
+
+@contextmanager
+def _source_session(index: Optional[int]) -> Iterator[Session]:
+    # None is the common database
+    if index is not None:
+        with shard_session(index) as session:
+            yield session
+        return
+    session = Session(bind=engine)
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+def _misplaced_users(source: Session, index: Optional[int]) -> List[str]:
+    # One query per model, so each is routed through that model's bind
+    user_ids = set()
+    for model in USER_MODELS:
+        user_ids.update(source.scalars(select(model.user_id).distinct()))
+    return sorted(user_id for user_id in user_ids if shard_for(user_id) != index)
+
+
+def _move_users(source: Session, user_ids: List[str]) -> None:
+    by_shard: Dict[int, List[str]] = defaultdict(list)
+    for user_id in user_ids:
+        by_shard[shard_for(user_id)].append(user_id)
+
+    for index, shard_user_ids in by_shard.items():
+        # Plain table statements; the shards have no users table to resolve
+        # the models' foreign keys against
+        rows = {
+            model: source.execute(
+                select(model.__table__).where(model.user_id.in_(shard_user_ids)),
+                bind_arguments={"mapper": model},
+            )
+            .mappings()
+            .all()
+            for model in USER_MODELS
+        }
+        # Replacing whatever an interrupted run left behind makes reruns safe
+        with shard_session(index) as target:
+            for model in USER_MODELS:
+                table = model.__table__
+                target.execute(
+                    delete(table).where(table.c.user_id.in_(shard_user_ids)),
+                    bind_arguments={"mapper": model},
+                )
+                if rows[model]:
+                    target.execute(
+                        insert(table),
+                        [dict(row) for row in rows[model]],
+                        bind_arguments={"mapper": model},
+                    )
+            target.commit()
+
+        for model in USER_MODELS:
+            table = model.__table__
+            source.execute(
+                delete(table).where(table.c.user_id.in_(shard_user_ids)),
+                bind_arguments={"mapper": model},
+            )
+        source.commit()
+
+
+def rebalance(include_common: bool = False, batch_size: int = 500) -> int:
+    """Move every user's rows to the shard their id hashes to.
+
+    With ``include_common``, rows still in the common database, from before
+    sharding was enabled, are moved too. Returns the number of users moved.
+    """
+    create_shard_tables()
+    sources = list(range(len(shard_engines))) + ([None] if include_common else [])
+    moved = 0
+    for index in sources:
+        with _source_session(index) as source:
+            misplaced = _misplaced_users(source, index)
+            for start in range(0, len(misplaced), batch_size):
+                _move_users(source, misplaced[start : start + batch_size])
+        moved += len(misplaced)
+        name = "the common database" if index is None else f"shard {index}"
+        print(f"Moved {len(misplaced)} users out of {name}")
+    return moved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("command", choices=["rebalance"])
+    parser.add_argument(
+        "--include-common",
+        action="store_true",
+        help="also move rows out of the common database",
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    if not shard_engines:
+        sys.exit("SHARD_URLS is not set")
+    total = rebalance(args.include_common, args.batch_size)
+    print(f"Moved {total} users in total")
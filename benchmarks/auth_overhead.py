@@ -0,0 +1,77 @@
+"""Authentication overhead per request.
+
+Times the authentication every protected endpoint runs, token
+verification plus loading the user, in four configurations:
+
+- verify + fetch: token without user claims, verified every time
+- cached + fetch: token without user claims, verification cached
+- verify + claims: token with name and email claims, verified every time
+- cached + claims: token with name and email claims, verification cached
+
+    python -m benchmarks.auth_overhead --requests 5000
+"""
+
+from statistics import median, quantiles
+from typing import List
+import argparse
+import sys
+import time
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from app.auth.jwt import create_access_token, verified_tokens  # noqa: E402
+from app.auth.models import User  # noqa: E402
+from app.auth.router import _authenticate, user_claims  # noqa: E402
+from app.bootstrap import bootstrap_database  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+
+
+def _time(token: str, cached: bool, requests: int) -> List[float]:
+    verified_tokens.clear()
+    verified_tokens.maxsize = settings.VERIFIED_TOKEN_CACHE_SIZE if cached else 0
+    timings = []
+    for _ in range(requests):
+        # A fresh session per call, as every request gets one
+        db = SessionLocal()
+        try:
+            started = time.perf_counter()
+            _authenticate(db, token)
+            timings.append(time.perf_counter() - started)
+        finally:
+            db.close()
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    bootstrap_database()
+    db = SessionLocal()
+    user = User(email="auth@example.com", name="auth", password_hash="unused")
+    db.add(user)
+    db.commit()
+    plain_token = create_access_token(user.id)
+    claims_token = create_access_token(user.id, claims=user_claims(user))
+    db.close()
+
+    runs = [
+        ("verify + fetch", plain_token, False),
+        ("cached + fetch", plain_token, True),
+        ("verify + claims", claims_token, False),
+        ("cached + claims", claims_token, True),
+    ]
+    print(f"{'configuration':<20}{'median us':>12}{'p95 us':>12}")
+    for name, token, cached in runs:
+        timings = _time(token, cached, args.requests)
+        p95 = quantiles(timings, n=20)[-1]
+        print(f"{name:<20}{median(timings) * 1e6:>12.1f}{p95 * 1e6:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
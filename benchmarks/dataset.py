@@ -0,0 +1,220 @@
+"""Synthetic dataset generator.
+
+Fills a database with users, their progress and their answers. Each user
+walks the seeded questionnaire the way a real one would: answers are drawn
+from each question's options or validation rules, and the next question is
+picked through ``next_question_mapping`` exactly as the answer endpoints do.
+Rows are written with bulk inserts, so millions of answers take minutes.
+
+Generate into the database named by DATABASE_URL from the repository root:
+
+    python -m benchmarks.dataset --answers 1000000
+
+Generated users are ``user<n>@example.com`` with the password ``password``.
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import argparse
+import random
+import sys
+import time
+import uuid
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.engine import Engine
+
+from app.auth.models import User
+from app.questions.graph import QuestionGraph, compile_graph
+from app.questions.models import QUESTION_ORDER, Question, UserAnswer, UserProgress
+
+BATCH_SIZE = 50_000
+
+TEXT_ANSWERS = [
+    "I care more about privacy than about features.",
+    "Mainstream phones are too expensive for what they offer.",
+    "I prefer open platforms that I can modify myself.",
+    "I only need calls and messages, nothing else.",
+]
+
+# bcrypt is deliberately slow, so every generated user shares one hash
+_password_hash: Optional[str] = None
+
+
+def _shared_password_hash() -> str:
+    global _password_hash
+    if _password_hash is None:
+        _password_hash = User.hash_password("password")
+    return _password_hash
+
+
+def _random_answer(rng: random.Random, question: Question) -> Any:
+    rules = question.validation_rules or {}
+    if question.type == "single_choice":
+        return rng.choice(question.options)
+    if question.type == "multiple_choice":
+        return rng.sample(
+            question.options, rng.randint(1, min(3, len(question.options)))
+        )
+    if question.type == "number":
+        return rng.randint(rules.get("min", 0), rules.get("max", 100))
+    if question.type == "date":
+        return (date(2020, 1, 1) + timedelta(days=rng.randrange(1800))).isoformat()
+    return rng.choice(TEXT_ANSWERS)
+
+
+def _walk(
+    rng: random.Random, questions: Dict[str, Question], graph: QuestionGraph
+) -> Iterator[Tuple[Question, Any]]:
+    # Follows the compiled graph, as submit_answer does
+    question = questions[graph.root]
+    while question is not None:
+        answer_value = _random_answer(rng, question)
+        yield question, answer_value
+        next_question_id = graph.next_question_id(question.id, answer_value)
+        question = questions.get(next_question_id) if next_question_id else None
+
+
+def _flush(conn, model, rows: List[Dict[str, Any]]) -> None:
+    if rows:
+        conn.execute(insert(model), rows)
+        rows.clear()
+
+
+def generate(
+    engine: Engine,
+    answers: int,
+    completed_fraction: float = 0.7,
+    seed: int = 0,
+    batch_size: int = BATCH_SIZE,
+) -> Dict[str, int]:
+    """Add users until at least ``answers`` answers have been written.
+
+    Expects the schema and seed questions to exist already.
+    """
+    rng = random.Random(seed)
+    now = datetime.now()
+
+    with engine.connect() as conn:
+        # Same order as load_first_question, which starts the questionnaire
+        rows = (
+            conn.execute(select(Question.__table__).order_by(*QUESTION_ORDER))
+            .mappings()
+            .all()
+        )
+        offset = conn.execute(select(func.count()).select_from(User)).scalar()
+
+    if not rows:
+        raise RuntimeError("Seed the questions before generating a dataset")
+    questions = {row["id"]: Question(**row) for row in rows}
+    graph = compile_graph(list(questions.values())).check()
+
+    counts = {"users": 0, "progress": 0, "answers": 0}
+    password_hash = _shared_password_hash()
+    users: List[Dict[str, Any]] = []
+    progresses: List[Dict[str, Any]] = []
+    user_answers: List[Dict[str, Any]] = []
+
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            # Durability is pointless for a throwaway dataset
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+
+        while counts["answers"] < answers:
+            user_id = str(uuid.uuid4())
+            started = now - timedelta(seconds=rng.randrange(180 * 24 * 3600))
+            path = list(_walk(rng, questions, graph))
+
+            # Users who have not finished stopped somewhere along their path
+            completed = rng.random() < completed_fraction
+            answered = path if completed else path[: rng.randrange(len(path))]
+
+            timestamp = started
+            for sequence_number, (question, answer_value) in enumerate(answered, 1):
+                timestamp += timedelta(seconds=rng.randint(5, 120))
+                user_answers.append(
+                    {
+                        "id": str(uuid.uuid4()),
+                        "user_id": user_id,
+                        "question_id": question.id,
+                        "answer_value": answer_value,
+                        "is_correct": (
+                            answer_value == question.correct_answer
+                            if question.correct_answer is not None
+                            else None
+                        ),
+                        "timestamp": timestamp,
+                        "sequence_number": sequence_number,
+                        "attempt": 1,
+                    }
+                )
+
+            completed_ids = [question.id for question, _ in answered]
+            current_question_id = None if completed else path[len(answered)][0].id
+            question_path = completed_ids + (
+                [current_question_id] if current_question_id else []
+            )
+
+            users.append(
+                {
+                    "id": user_id,
+                    "email": f"user{offset + counts['users']}@example.com",
+                    "name": f"User {offset + counts['users']}",
+                    "password_hash": password_hash,
+                    "created_at": started,
+                    "last_login": timestamp,
+                }
+            )
+            progresses.append(
+                {
+                    "id": str(uuid.uuid4()),
+                    "user_id": user_id,
+                    "current_question_id": current_question_id,
+                    "question_path": question_path,
+                    "completed_questions": completed_ids,
+                    "start_time": started,
+                    "last_activity": timestamp,
+                    "is_completed": completed,
+                    "version": len(answered) + 1,
+                    "attempt": 1,
+                }
+            )
+            counts["users"] += 1
+            counts["progress"] += 1
+            counts["answers"] += len(answered)
+
+            if len(user_answers) >= batch_size:
+                _flush(conn, User, users)
+                _flush(conn, UserProgress, progresses)
+                _flush(conn, UserAnswer, user_answers)
+
+        _flush(conn, User, users)
+        _flush(conn, UserProgress, progresses)
+        _flush(conn, UserAnswer, user_answers)
+
+    return counts
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--answers", type=int, required=True)
+    parser.add_argument("--completed-fraction", type=float, default=0.7)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    from app.bootstrap import bootstrap_database
+    from app.database import engine
+
+    bootstrap_database()
+    started = time.perf_counter()
+    counts = generate(engine, args.answers, args.completed_fraction, args.seed)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Generated {counts['users']} users and {counts['answers']} answers "
+        f"in {elapsed:.1f}s ({counts['answers'] / elapsed:,.0f} answers/s)"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+"""Shared setup for the scripts in this directory.
+
+The scripts run the application in-process against a throwaway SQLite
+database, so they need no running server. Run them from the repository
+root, for example ``python -m benchmarks.query_budget``. They use
+FastAPI's TestClient, which needs ``httpx`` installed.
+"""
+
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import os
+import tempfile
+import time
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+def configure_environment(
+    directory: Optional[str] = None, environ: Optional[Dict[str, str]] = None
+) -> str:
+    # Must run before anything under app/ is imported; settings already
+    # present in the environment win
+    environ = os.environ if environ is None else environ
+    directory = directory or tempfile.mkdtemp(prefix="questionnaire-bench-")
+    environ.setdefault("DATABASE_URL", f"sqlite:///{directory}/bench.db")
+    environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    environ.setdefault("SECRET_KEY_FILE", os.path.join(directory, ".secret_key"))
+    # Keep periodic cache version checks out of the measurements
+    environ.setdefault("CACHE_VERSION_POLL_SECONDS", "3600")
+    return directory
+
+
+def create_client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    return TestClient(app)
+
+
+def wait_until_ready(client, timeout: float = 10.0) -> None:
+    # Cache warming runs in the background after startup
+    deadline = time.monotonic() + timeout
+    while client.get("/ready").status_code != 200:
+        if time.monotonic() > deadline:
+            raise RuntimeError("Application did not become ready")
+        time.sleep(0.01)
+
+
+def register_and_login(
+    client, email: str, password: str = "password"
+) -> Dict[str, str]:
+    client.post(
+        "/api/register",
+        json={
+            "email": email,
+            "password": password,
+            "password_confirmation": password,
+            "name": email.split("@")[0],
+        },
+    )
+    response = client.post("/api/login", data={"username": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+def sample_answer(question: dict, choice: int = 0):
+    # A valid answer for any question type; choice picks the branch
+    options = question.get("options") or []
+    rules = question.get("validation_rules") or {}
+    if question["type"] == "single_choice":
+        return options[choice % len(options)]
+    if question["type"] == "multiple_choice":
+        return options[: rules.get("max_choices", 1)]
+    if question["type"] == "number":
+        return rules.get("min", 0) + choice
+    if question["type"] == "date":
+        return "2024-01-15"
+    return "Synthetic answer text"
+
+
+def answer_questions(client, headers: Dict[str, str], count: int, choice: int = 0):
+    """Start the questionnaire and answer up to ``count`` questions.
+
+    Returns the questions answered and the question now being shown, which
+    is None once the questionnaire is completed.
+    """
+    question = client.get("/api/questions/start", headers=headers).json()
+    answered: List[dict] = []
+    while question is not None and len(answered) < count:
+        response = client.post(
+            "/api/answers",
+            headers=headers,
+            json={
+                "question_id": question["id"],
+                "answer_value": sample_answer(question, choice),
+            },
+        ).json()
+        answered.append(question)
+        question = response["question"]
+    return answered, question
+
+
+class StatementCounter:
+    def __init__(self):
+        self.statements: List[str] = []
+
+    @property
+    def reads(self) -> int:
+        return sum(1 for s in self.statements if _is_read(s))
+
+    @property
+    def writes(self) -> int:
+        return len(self.statements) - self.reads
+
+
+def _is_read(statement: str) -> bool:
+    return statement.lstrip().split(None, 1)[0].upper() in ("SELECT", "WITH", "PRAGMA")
+
+
+@contextmanager
+def count_statements():
+    """Count the SQL statements executed on any engine inside the block."""
+    counter = StatementCounter()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        yield counter
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
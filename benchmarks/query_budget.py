@@ -0,0 +1,340 @@
+"""Query-budget regression check for every API endpoint.
+
+Exercises each route of the auth and questionnaire routers for users at
+several points of the questionnaire, counts the SQL statements each call
+executes and fails when a call exceeds the budget declared in BUDGETS.
+Budgets do not grow with path length, so a change that turns an endpoint
+back into one query per answered question is caught here.
+
+    python -m benchmarks.query_budget
+
+Exits with status 1 when any budget is exceeded or a route is missing from
+both BUDGETS and UNBUDGETED.
+Set QUERY_BUDGET_TIMING_TOLERANCE to widen the timing bands on slow
+machines (0.5 allows 50% over the declared milliseconds).
+"""
+
+from collections import defaultdict
+from statistics import median
+from typing import Callable, Dict, List, NamedTuple, Optional
+import os
+import sys
+import time
+
+from benchmarks.harness import (
+    answer_questions,
+    configure_environment,
+    count_statements,
+    create_client,
+    register_and_login,
+    sample_answer,
+    wait_until_ready,
+)
+
+
+class Budget(NamedTuple):
+    reads: int
+    writes: int
+    # Median latency, for critical read paths only; writes mostly measure
+    # the disk's commit latency, which varies too much between machines
+    milliseconds: Optional[float] = None
+
+
+# Maximum statements per call, whatever the user's path length
+BUDGETS: Dict[str, Budget] = {
+    "POST /api/register": Budget(reads=2, writes=1),
+    "POST /api/login": Budget(reads=2, writes=1),
+    "POST /api/logout": Budget(reads=0, writes=0),
+    "POST /api/refresh-token": Budget(reads=1, writes=0),
+    "GET /api/questions/start": Budget(reads=2, writes=1),
+    "GET /api/questions/start (restart)": Budget(reads=2, writes=4),
+    "GET /api/questions/{question_id}": Budget(reads=0, writes=0, milliseconds=5),
+    "GET /api/questions/{question_id} (not modified)": Budget(reads=0, writes=0),
+    "POST /api/answers": Budget(reads=2, writes=2),
+    "POST /api/answers (completing)": Budget(reads=6, writes=3),
+    "PUT /api/answers/{question_id}": Budget(reads=2, writes=3),
+    "GET /api/questions/previous/{current_question_id}": Budget(reads=1, writes=2),
+    "GET /api/progress": Budget(reads=3, writes=1, milliseconds=10),
+    "GET /api/progress (not modified)": Budget(reads=1, writes=0, milliseconds=5),
+    "GET /api/summary": Budget(reads=3, writes=0, milliseconds=10),
+    "GET /api/summary (not modified)": Budget(reads=1, writes=0, milliseconds=5),
+    "GET /api/summary (completed)": Budget(reads=1, writes=0, milliseconds=5),
+    "GET /api/question-history": Budget(reads=1, writes=0, milliseconds=5),
+    "GET /api/analytics/crosstab": Budget(reads=3, writes=0),
+    "GET /api/analytics/crosstab (cached)": Budget(reads=0, writes=0, milliseconds=5),
+}
+
+# Routes deliberately left out, with the reason
+UNBUDGETED: Dict[str, str] = {
+    "GET /api/progress/stream": "long-lived event stream, one snapshot read",
+}
+
+# Position in the questionnaire at which each endpoint is measured; the
+# last question of every branch is always measured as well
+PATH_LENGTHS = (1, 3, 6)
+
+TIMING_ROUNDS = 20
+
+
+class Measurement(NamedTuple):
+    reads: int
+    writes: int
+    seconds: float
+
+
+def main() -> int:
+    configure_environment()
+    tolerance = float(os.environ.get("QUERY_BUDGET_TIMING_TOLERANCE", "0.5"))
+
+    results: Dict[str, List[Measurement]] = defaultdict(list)
+
+    with create_client() as client:
+        wait_until_ready(client)
+
+        def run(call: Callable):
+            with count_statements() as counter:
+                started = time.perf_counter()
+                response = call()
+                elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise RuntimeError(f"{response.url} failed: {response.text}")
+            return response, Measurement(counter.reads, counter.writes, elapsed)
+
+        def measure(name: str, call: Callable, rounds: int = 1):
+            for _ in range(rounds):
+                response, measurement = run(call)
+                results[name].append(measurement)
+            return response
+
+        # Authentication endpoints
+        password = "password"
+        user = {
+            "email": "budget@example.com",
+            "password": password,
+            "password_confirmation": password,
+            "name": "Budget",
+        }
+        measure("POST /api/register", lambda: client.post("/api/register", json=user))
+        response = measure(
+            "POST /api/login",
+            lambda: client.post(
+                "/api/login", data={"username": user["email"], "password": password}
+            ),
+        )
+        headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        measure(
+            "POST /api/refresh-token",
+            lambda: client.post("/api/refresh-token", headers=headers),
+        )
+        measure("POST /api/logout", lambda: client.post("/api/logout"))
+        measure(
+            "GET /api/questions/start",
+            lambda: client.get("/api/questions/start", headers=headers),
+        )
+
+        # The first question branches three ways, with different path lengths
+        for choice in range(3):
+            headers = register_and_login(client, f"probe-{choice}@example.com")
+            answered, _ = answer_questions(client, headers, sys.maxsize, choice)
+            full_length = len(answered)
+
+            for length in sorted({*PATH_LENGTHS, full_length}):
+                if length > full_length:
+                    continue
+                headers = register_and_login(
+                    client, f"user-{length}-{choice}@example.com"
+                )
+                _, current = answer_questions(client, headers, length - 1, choice)
+
+                rounds = TIMING_ROUNDS if choice == 0 else 1
+                measure(
+                    "GET /api/questions/{question_id}",
+                    lambda: client.get(
+                        f"/api/questions/{current['id']}", headers=headers
+                    ),
+                    rounds,
+                )
+                measure(
+                    "GET /api/progress",
+                    lambda: client.get("/api/progress", headers=headers),
+                    rounds,
+                )
+                measure(
+                    "GET /api/summary",
+                    lambda: client.get("/api/summary", headers=headers),
+                    rounds,
+                )
+                measure(
+                    "GET /api/question-history",
+                    lambda: client.get("/api/question-history", headers=headers),
+                    rounds,
+                )
+
+                # Conditional requests answered from the ETag alone
+                for path in (
+                    f"/api/questions/{current['id']}",
+                    "/api/progress",
+                    "/api/summary",
+                ):
+                    etag = client.get(path, headers=headers).headers["ETag"]
+                    response = measure(
+                        f"GET {_route_of(path)} (not modified)",
+                        lambda: client.get(
+                            path, headers={**headers, "If-None-Match": etag}
+                        ),
+                        rounds,
+                    )
+                    if response.status_code != 304:
+                        raise RuntimeError(f"{path} ignored If-None-Match")
+
+                response, measurement = run(
+                    lambda: client.post(
+                        "/api/answers",
+                        headers=headers,
+                        json={
+                            "question_id": current["id"],
+                            "answer_value": sample_answer(current, choice),
+                        },
+                    )
+                )
+                following = response.json()["question"]
+                if following is None:
+                    results["POST /api/answers (completing)"].append(measurement)
+                else:
+                    results["POST /api/answers"].append(measurement)
+
+                if following is None:
+                    measure(
+                        "GET /api/summary (completed)",
+                        lambda: client.get("/api/summary", headers=headers),
+                        rounds,
+                    )
+                    measure(
+                        "GET /api/questions/start (restart)",
+                        lambda: client.get("/api/questions/start", headers=headers),
+                    )
+                    continue
+
+                measure(
+                    "GET /api/questions/previous/{current_question_id}",
+                    lambda: client.get(
+                        f"/api/questions/previous/{following['id']}",
+                        headers=headers,
+                    ),
+                )
+                measure(
+                    "PUT /api/answers/{question_id}",
+                    lambda: client.put(
+                        f"/api/answers/{current['id']}",
+                        headers=headers,
+                        json={
+                            "question_id": current["id"],
+                            "answer_value": sample_answer(current, choice),
+                        },
+                    ),
+                )
+
+        # Analytics over every answer stored above, computed then cached, as
+        # an analyst
+        _make_analyst(headers)
+        crosstab = (
+            "/api/analytics/crosstab"
+            f"?row_question_id={answered[0]['id']}"
+            f"&column_question_id="
+            f"{next(q['id'] for q in answered if q['type'] == 'number')}"
+        )
+        measure(
+            "GET /api/analytics/crosstab",
+            lambda: client.get(crosstab, headers=headers),
+        )
+        measure(
+            "GET /api/analytics/crosstab (cached)",
+            lambda: client.get(crosstab, headers=headers),
+            TIMING_ROUNDS,
+        )
+
+        routes = _api_routes()
+
+    return _report(results, routes, tolerance)
+
+
+def _make_analyst(headers: Dict[str, str]) -> None:
+    from jose import jwt
+    from app.config import settings
+
+    token = headers["Authorization"].split(" ", 1)[1]
+    settings.ANALYST_USER_IDS.append(jwt.get_unverified_claims(token)["sub"])
+
+
+def _route_of(path: str) -> str:
+    if path.startswith("/api/questions/"):
+        return "/api/questions/{question_id}"
+    return path
+
+
+def _api_routes() -> List[str]:
+    from app.analytics.router import router as analytics_router
+    from app.auth.router import router as auth_router
+    from app.questions.router import router as questions_router
+
+    return [
+        f"{method} {route.path}"
+        for router in (auth_router, questions_router, analytics_router)
+        for route in router.routes
+        for method in sorted(route.methods)
+    ]
+
+
+def _report(
+    results: Dict[str, List[Measurement]], routes: List[str], tolerance: float
+) -> int:
+    failures = []
+
+    print(f"{'endpoint':<55}{'reads':>12}{'writes':>12}{'median ms':>16}")
+    for name, budget in BUDGETS.items():
+        measurements = results.get(name)
+        if not measurements:
+            failures.append(f"{name}: never exercised")
+            continue
+
+        reads = max(m.reads for m in measurements)
+        writes = max(m.writes for m in measurements)
+        milliseconds = median(m.seconds for m in measurements) * 1000
+
+        timing = f"{milliseconds:.2f}"
+        if budget.milliseconds is not None:
+            timing += f"/{budget.milliseconds:g}"
+        print(
+            f"{name:<55}{f'{reads}/{budget.reads}':>12}"
+            f"{f'{writes}/{budget.writes}':>12}{timing:>16}"
+        )
+
+        if reads > budget.reads:
+            failures.append(f"{name}: {reads} reads, budget {budget.reads}")
+        if writes > budget.writes:
+            failures.append(f"{name}: {writes} writes, budget {budget.writes}")
+        if budget.milliseconds is not None and milliseconds > budget.milliseconds * (
+            1 + tolerance
+        ):
+            failures.append(
+                f"{name}: median {milliseconds:.2f} ms, "
+                f"budget {budget.milliseconds:g} ms (+{tolerance:.0%})"
+            )
+
+    budgeted = {name.split(" (")[0] for name in BUDGETS} | set(UNBUDGETED)
+    for route in routes:
+        if route not in budgeted:
+            failures.append(f"{route}: no budget declared")
+
+    if failures:
+        print("\nBudget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+
+    print("\nAll endpoints within budget")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
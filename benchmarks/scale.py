@@ -0,0 +1,142 @@
+"""Query latency at scale.
+
+For each dataset size, generates a fresh SQLite database with that many
+answers (see ``benchmarks.dataset``) and times the queries behind the hot
+endpoints for randomly sampled users:
+
+- get_summary: progress lookup and the user's answers, with question texts
+  from the question cache
+- get_progress: progress lookup and the user's answers
+- update_answer: progress lookup, answer upsert and progress update
+- restart delete: deleting a user's answers when they restart
+
+    python -m benchmarks.scale --sizes 10000 1000000 10000000
+"""
+
+from statistics import median, quantiles
+from typing import Callable, Dict, List
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.harness import configure_environment
+
+configure_environment()
+
+from sqlalchemy import create_engine, func, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+
+from app.answers.storage import upsert_answer  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.questions.models import UserAnswer, UserProgress  # noqa: E402
+from app.questions.seed import seed_questions  # noqa: E402
+from app.questions.summary import build_summary  # noqa: E402
+from benchmarks.dataset import generate  # noqa: E402
+import app.auth.models  # noqa: E402, F401
+import app.cache  # noqa: E402, F401
+
+SIZES = (10_000, 1_000_000, 10_000_000)
+QUERIES = ("get_summary", "get_progress", "update_answer", "restart delete")
+
+
+def _progress(db: Session, user_id: str) -> UserProgress:
+    return db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+
+
+def get_summary(db: Session, user_id: str) -> None:
+    build_summary(db, _progress(db, user_id))
+
+
+def get_progress(db: Session, user_id: str) -> None:
+    progress = _progress(db, user_id)
+    db.query(UserAnswer.question_id, UserAnswer.answer_value).filter(
+        UserAnswer.user_id == user_id,
+        UserAnswer.attempt == progress.attempt,
+        UserAnswer.question_id.in_(progress.completed_questions),
+    ).order_by(UserAnswer.timestamp).all()
+
+
+def update_answer(db: Session, user_id: str) -> None:
+    progress = _progress(db, user_id)
+    upsert_answer(
+        db,
+        user_id=user_id,
+        attempt=progress.attempt,
+        question_id=progress.question_path[0],
+        answer_value="updated",
+        is_correct=None,
+        sequence_number=1,
+    )
+    progress.last_activity = func.now()
+    db.commit()
+
+
+def restart_delete(db: Session, user_id: str) -> None:
+    db.query(UserAnswer).filter(UserAnswer.user_id == user_id).delete()
+    # Keep the dataset intact for the following samples
+    db.rollback()
+
+
+RUNNERS: Dict[str, Callable[[Session, str], None]] = {
+    "get_summary": get_summary,
+    "get_progress": get_progress,
+    "update_answer": update_answer,
+    "restart delete": restart_delete,
+}
+
+
+def measure(size: int, samples: int, directory: str) -> Dict[str, List[float]]:
+    engine = create_engine(f"sqlite:///{os.path.join(directory, f'scale-{size}.db')}")
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        seed_questions(db)
+
+    started = time.perf_counter()
+    counts = generate(engine, size)
+    print(
+        f"{size:>12,} answers: generated {counts['users']:,} users "
+        f"in {time.perf_counter() - started:.1f}s",
+        file=sys.stderr,
+    )
+
+    timings: Dict[str, List[float]] = {name: [] for name in QUERIES}
+    with Session(engine) as db:
+        user_ids = db.scalars(
+            select(UserProgress.user_id)
+            .where(func.json_array_length(UserProgress.completed_questions) > 0)
+            .order_by(func.random())
+            .limit(samples)
+        ).all()
+        for user_id in user_ids:
+            for name, run in RUNNERS.items():
+                db.expunge_all()
+                query_started = time.perf_counter()
+                run(db, user_id)
+                timings[name].append(time.perf_counter() - query_started)
+    engine.dispose()
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(SIZES))
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--directory", default=None)
+    args = parser.parse_args()
+
+    directory = args.directory or tempfile.mkdtemp(prefix="questionnaire-scale-")
+    results = {size: measure(size, args.samples, directory) for size in args.sizes}
+
+    print(f"{'query':<16}{'answers':>14}{'median ms':>12}{'p95 ms':>12}")
+    for name in QUERIES:
+        for size, timings in results.items():
+            samples = [t * 1000 for t in timings[name]]
+            p95 = quantiles(samples, n=20)[-1] if len(samples) > 1 else samples[0]
+            print(f"{name:<16}{size:>14,}{median(samples):>12.3f}{p95:>12.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
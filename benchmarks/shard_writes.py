@@ -0,0 +1,140 @@
+"""Answer write throughput with and without sharding.
+
+Each round starts a fresh interpreter with a new set of SQLite databases
+and has several threads store answers for their own users concurrently.
+Every answer runs the writes of submit_answer in its own transaction: the
+answer upsert and the progress update. Shard count 0 is the unsharded
+baseline.
+
+    python -m benchmarks.shard_writes --shards 0 1 2 4 --threads 8
+
+SQLite shards in one directory still share a disk, and each commit waits
+for its fsyncs, so on slow storage the numbers mostly reflect fsync cost.
+``--no-sync`` turns the fsyncs off to compare lock contention alone.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import configure_environment
+
+CHILD = """
+import json, sys, threading, time
+from datetime import datetime
+
+from app.answers.storage import upsert_answer
+from app.bootstrap import bootstrap_database
+from app.database import SessionLocal
+from app.questions.models import Question, UserProgress
+from app.sharding import route_to_shard
+
+threads, users_per_thread, answers_per_user, no_sync = map(int, sys.argv[1:5])
+if no_sync:
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    @event.listens_for(Engine, "connect")
+    def skip_fsync(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA synchronous = OFF")
+
+bootstrap_database()
+
+db = SessionLocal()
+question_ids = [question_id for (question_id,) in db.query(Question.id)]
+db.close()
+
+user_ids = [f"user-{n}" for n in range(threads * users_per_thread)]
+for user_id in user_ids:
+    db = SessionLocal()
+    route_to_shard(db, user_id)
+    db.add(UserProgress(user_id=user_id, question_path=[], completed_questions=[]))
+    db.commit()
+    db.close()
+
+def answer(user_ids):
+    for n in range(answers_per_user):
+        question_id = question_ids[n % len(question_ids)]
+        for user_id in user_ids:
+            db = SessionLocal()
+            route_to_shard(db, user_id)
+            progress = (
+                db.query(UserProgress).filter(UserProgress.user_id == user_id).first()
+            )
+            upsert_answer(db, user_id, progress.attempt, question_id, n, None, n + 1)
+            progress.last_activity = datetime.now()
+            db.commit()
+            db.close()
+
+workers = [
+    threading.Thread(target=answer, args=(user_ids[t::threads],))
+    for t in range(threads)
+]
+started = time.perf_counter()
+for worker in workers:
+    worker.start()
+for worker in workers:
+    worker.join()
+elapsed = time.perf_counter() - started
+print(json.dumps({"answers": len(user_ids) * answers_per_user, "seconds": elapsed}))
+"""
+
+
+def run_child(shards: int, args: argparse.Namespace) -> dict:
+    directory = tempfile.mkdtemp(prefix="questionnaire-shards-")
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    env.pop("SECRET_KEY_FILE", None)
+    env["SHARD_URLS"] = json.dumps(
+        [f"sqlite:///{directory}/shard-{index}.db" for index in range(shards)]
+    )
+    configure_environment(directory, env)
+    output = subprocess.run(
+        [
+            sys.executable,
+            "-W",
+            "ignore",
+            "-c",
+            CHILD,
+            str(args.threads),
+            str(args.users_per_thread),
+            str(args.answers_per_user),
+            str(int(args.no_sync)),
+        ],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--shards", type=int, nargs="+", default=[0, 1, 2, 4])
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--users-per-thread", type=int, default=4)
+    parser.add_argument("--answers-per-user", type=int, default=50)
+    parser.add_argument(
+        "--no-sync",
+        action="store_true",
+        help="turn off SQLite fsyncs to measure lock contention alone",
+    )
+    args = parser.parse_args()
+
+    print(f"{'shards':<10}{'answers':>10}{'seconds':>10}{'answers/s':>12}")
+    for shards in args.shards:
+        result = run_child(shards, args)
+        print(
+            f"{shards or 'none':<10}{result['answers']:>10}"
+            f"{result['seconds']:>10.2f}"
+            f"{result['answers'] / result['seconds']:>12.0f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
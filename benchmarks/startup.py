@@ -0,0 +1,104 @@
+"""Cold start benchmark.
+
+Each round starts a fresh interpreter and measures how long it takes to
+import the application, run its startup hook, serve a first authenticated
+request and report ready. "cold" rounds start from an empty database,
+"warm" rounds reuse one whose schema and seed data are current.
+
+    python -m benchmarks.startup --rounds 5
+"""
+
+from statistics import median
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.harness import configure_environment
+
+CHILD = """
+import json, time, uuid
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+
+from fastapi.testclient import TestClient
+client = TestClient(app.main.app)
+client.__enter__()
+booted = time.perf_counter()
+
+from app.auth.jwt import create_access_token
+from app.auth.models import User
+from app.database import SessionLocal
+db = SessionLocal()
+user = User(email=f"{uuid.uuid4()}@example.com", name="Bench", password_hash="-")
+db.add(user)
+db.commit()
+headers = {"Authorization": f"Bearer {create_access_token(user.id)}"}
+db.close()
+
+request_started = time.perf_counter()
+assert client.get("/api/questions/start", headers=headers).status_code == 200
+first_request = time.perf_counter() - request_started
+
+while client.get("/ready").status_code != 200:
+    time.sleep(0.001)
+ready = time.perf_counter()
+client.__exit__(None, None, None)
+
+print(json.dumps({
+    "import": imported - started,
+    "startup": booted - imported,
+    "first request": first_request,
+    "ready": ready - started,
+}))
+"""
+
+PHASES = ("import", "startup", "first request", "ready")
+
+
+def run_child(directory: str) -> dict:
+    # Every child gets the database in its own directory
+    env = dict(os.environ)
+    env.pop("DATABASE_URL", None)
+    env.pop("SECRET_KEY_FILE", None)
+    configure_environment(directory, env)
+    output = subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", CHILD],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    results = {"cold": [], "warm": []}
+
+    warm_directory = tempfile.mkdtemp(prefix="questionnaire-startup-")
+    run_child(warm_directory)  # Create and seed the reused database
+
+    for _ in range(args.rounds):
+        results["cold"].append(run_child(tempfile.mkdtemp(prefix="questionnaire-")))
+        results["warm"].append(run_child(warm_directory))
+
+    print(f"{'median ms':<10}" + "".join(f"{phase:>16}" for phase in PHASES))
+    for scenario, rounds in results.items():
+        print(
+            f"{scenario:<10}"
+            + "".join(
+                f"{median(r[phase] for r in rounds) * 1000:>16.2f}" for phase in PHASES
+            )
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())